@@ -148,6 +148,40 @@ USE_TZ = True
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'noreply@eventapp.com'
 
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+CALENDAR_CACHE_ALIAS = 'default'
+CALENDAR_CACHE_TIMEOUT = int(os.environ.get('CALENDAR_CACHE_TIMEOUT', '3600'))
+
+# Occurrence materialization: pre-expand recurring events into the
+# Occurrence table over a rolling window around today
+OCCURRENCE_MATERIALIZATION = os.environ.get('OCCURRENCE_MATERIALIZATION', 'False') == 'True'
+OCCURRENCE_HORIZON_DAYS = int(os.environ.get('OCCURRENCE_HORIZON_DAYS', '548'))  # ~18 months ahead
+OCCURRENCE_HISTORY_DAYS = int(os.environ.get('OCCURRENCE_HISTORY_DAYS', '92'))
+
+# Threads that expand recurring events for the async calendar endpoints
+# (shared by all requests of a worker process)
+CALENDAR_EXPANSION_WORKERS = int(os.environ.get('CALENDAR_EXPANSION_WORKERS', '4'))
+
+# Worker processes for parallel .ics exports (?parallel=true and
+# `manage.py export_ics`); 0 uses one per CPU core
+EXPORT_PROCESSES = int(os.environ.get('EXPORT_PROCESSES', '0'))
+
+# Background exports (`manage.py run_export_jobs`) are written here and
+# deleted this many days after they finish
+EXPORT_ROOT = os.environ.get('EXPORT_ROOT', os.path.join(BASE_DIR, 'exports'))
+EXPORT_JOB_RETENTION_DAYS = int(os.environ.get('EXPORT_JOB_RETENTION_DAYS', '7'))
+
+# Overrides of occurrences older than this many days are removed by
+# `manage.py compact_overrides`; 0 keeps them forever
+OVERRIDE_RETENTION_DAYS = int(os.environ.get('OVERRIDE_RETENTION_DAYS', '0'))
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
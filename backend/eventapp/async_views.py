@@ -0,0 +1,190 @@
+"""Async variants of the calendar and export endpoints.
+
+DRF views are synchronous, so these are Django class-based views with async
+handlers. They accept the same JWT bearer tokens as the API, read through
+Django's async ORM and hand recurrence expansion and .ics serialization to
+the bounded pool in eventapp.expansion, so a worker keeps serving other
+requests while a large calendar is built. They only run concurrently when
+the project is served by an ASGI server (backendeventProject.asgi).
+"""
+from collections import defaultdict
+from datetime import datetime
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import calendar_cache, ical
+from .expansion import EXPANSION_BATCH_SIZE, expand_windows_concurrently, materialized_windows, run_in_pool
+from .materialization import get_horizon
+from .models import Event, OccurrenceOverride
+from .payload import SHAPES, CalendarPayload, WindowsPayload
+from .recurrence import aget_override_index
+from .versioning import conditional_calendar
+from .views import parse_aware, parse_windows
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def parse_window(params):
+    """The start/end window of a request; raises ValueError on bad input"""
+    try:
+        return parse_aware(params['start']), parse_aware(params['end'])
+    except KeyError:
+        raise ValueError('Missing start or end parameters')
+    except ValueError:
+        raise ValueError('Invalid date format')
+
+
+class AsyncAPIView(View):
+    """Authenticates the JWT bearer token like the DRF views before dispatching"""
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            authenticated = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except AuthenticationFailed as e:
+            detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            return JsonResponse(detail, status=e.status_code)
+        if authenticated is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        request.user = authenticated[0]
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncCalendarView(AsyncAPIView):
+    """GET /calendar/async/ -- CalendarView's windows and shapes, built asynchronously.
+
+    Paging (limit/cursor) is only offered by the sync endpoint.
+    """
+
+    @conditional_calendar
+    async def get(self, request):
+        shape = request.GET.get('shape', 'flat')
+        if shape not in SHAPES:
+            return error(f"shape must be one of {', '.join(SHAPES)}")
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            return error('Paging is only supported by /calendar/')
+
+        multiple = 'window' in request.GET or 'months' in request.GET
+        try:
+            windows = parse_windows(request.GET) if multiple else [parse_window(request.GET)]
+        except ValueError as e:
+            return error(str(e))
+
+        buckets = await self.window_results(request.user, windows)
+        if multiple:
+            payload = WindowsPayload(windows, [CalendarPayload(groups, shape) for groups in buckets])
+        else:
+            payload = CalendarPayload(buckets[0], shape)
+        return HttpResponse(payload.to_json(), content_type='application/json')
+
+    async def window_results(self, user, windows):
+        """Occurrence groups for each window, from the cache where possible"""
+        results = await sync_to_async(lambda: [calendar_cache.get_window(user, *w) for w in windows])()
+        missing = [i for i, cached in enumerate(results) if cached is None]
+        if not missing:
+            return results
+
+        horizon = await sync_to_async(get_horizon)()
+        missing_windows = [windows[i] for i in missing]
+        if horizon and all(horizon.covers(*window) for window in missing_windows):
+            built = await sync_to_async(materialized_windows)(user, missing_windows)
+        else:
+            built = await self.expanded_results(user, missing_windows)
+
+        for i, groups in zip(missing, built):
+            results[i] = groups
+        await sync_to_async(lambda: [calendar_cache.set_window(user, *windows[i], results[i]) for i in missing])()
+        return results
+
+    async def expanded_results(self, user, windows):
+        span_start = min(start for start, _ in windows)
+        span_end = max(end for _, end in windows)
+        events = [
+            event async for event in
+            Event.objects.overlapping(user, span_start, span_end).aiterator(chunk_size=ical.EXPORT_CHUNK_SIZE)
+        ]
+        overrides = await aget_override_index(user, span_start, span_end)
+        return await expand_windows_concurrently(events, overrides, windows)
+
+
+async def stream_in_batches(events, overrides, render):
+    """Yield an .ics file, serializing batches of events on the expansion pool.
+
+    Each batch's overrides are read from the `overrides` queryset just before
+    the batch is rendered, so only one batch of them is held at a time.
+    """
+    async def rendered(batch):
+        loaded = [override async for override in overrides.filter(event__in=[event.pk for event in batch])]
+        return await run_in_pool(render, batch, loaded)
+
+    yield ical.calendar_header()
+    batch = []
+    async for event in events.aiterator(chunk_size=ical.EXPORT_CHUNK_SIZE):
+        batch.append(event)
+        if len(batch) == EXPANSION_BATCH_SIZE:
+            yield await rendered(batch)
+            batch = []
+    if batch:
+        yield await rendered(batch)
+    yield ical.CALENDAR_FOOTER
+
+
+def render_occurrences(batch, overrides, **kwargs):
+    index = {(override.event_id, override.original_start): override for override in overrides}
+    return b''.join(ical.occurrence_chunks(batch, index, **kwargs))
+
+
+def render_series(batch, overrides, **kwargs):
+    by_event = defaultdict(list)
+    for override in overrides:
+        by_event[override.event_id].append(override)
+    return b''.join(ical.series_chunks(batch, by_event, **kwargs))
+
+
+class AsyncExportCalendarView(AsyncAPIView):
+    """GET /calendar/export/async/ -- ExportCalendarView, streamed asynchronously"""
+
+    @conditional_calendar
+    async def get(self, request):
+        try:
+            start, end = parse_window(request.GET)
+        except ValueError as e:
+            return error(str(e))
+        mode = request.GET.get('mode', 'occurrences')
+        if mode not in ('occurrences', 'series'):
+            return error('Invalid mode, expected occurrences or series')
+
+        events = Event.objects.overlapping(request.user, start, end)
+        dtstamp = datetime.now()
+        overrides = OccurrenceOverride.objects.all()
+        if mode == 'series':
+            # One VEVENT per series with RRULE/EXDATE/RECURRENCE-ID
+            render = partial(render_series, dtstamp=dtstamp)
+        else:
+            overrides = overrides.filter(original_start__gte=start, original_start__lte=end)
+            render = partial(render_occurrences, start=start, end=end, dtstamp=dtstamp)
+        response = StreamingHttpResponse(stream_in_batches(events, overrides, render), content_type='text/calendar')
+        response['Content-Disposition'] = 'attachment; filename="calendar.ics"'
+        return response
+
+
+class AsyncExportEventView(AsyncAPIView):
+    """GET /events/<id>/export/async/ -- ExportEventView, built on the expansion pool"""
+
+    @conditional_calendar
+    async def get(self, request, event_id):
+        try:
+            event = await Event.objects.aget(id=event_id, user=request.user)
+        except Event.DoesNotExist:
+            return JsonResponse({'detail': 'Not found.'}, status=404)
+        overrides = [override async for override in event.overrides.all()]
+        content = await run_in_pool(ical.event_calendar, event, overrides, datetime.now())
+        response = HttpResponse(content, content_type='text/calendar')
+        response['Content-Disposition'] = f'attachment; filename="event_{event.id}.ics"'
+        return response
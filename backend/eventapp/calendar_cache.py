@@ -0,0 +1,56 @@
+"""Cache of built calendar windows.
+
+Entries are keyed by (user, calendar_version, start, end). The version is
+bumped by the Event/OccurrenceOverride signals on every write, which makes
+all of a user's cached windows unreachable at once; stale entries then age
+out of the cache backend. Uses the cache alias named by CALENDAR_CACHE_ALIAS
+(a local-memory cache unless CACHE_BACKEND is configured).
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+HITS_KEY = 'calendar:stats:hits'
+MISSES_KEY = 'calendar:stats:misses'
+
+# Bumped whenever the layout of cached windows changes (see eventapp.payload)
+FORMAT_VERSION = 2
+
+
+def get_cache():
+    return caches[getattr(settings, 'CALENDAR_CACHE_ALIAS', 'default')]
+
+
+def window_key(user, start, end):
+    return f'calendar:v{FORMAT_VERSION}:{user.pk}:{user.calendar_version}:{start.isoformat()}:{end.isoformat()}'
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_window(user, start, end):
+    """Return the cached occurrence groups for a window, or None on a miss"""
+    results = get_cache().get(window_key(user, start, end))
+    _count(MISSES_KEY if results is None else HITS_KEY)
+    return results
+
+
+def set_window(user, start, end, results):
+    timeout = getattr(settings, 'CALENDAR_CACHE_TIMEOUT', 3600)
+    get_cache().set(window_key(user, start, end), results, timeout=timeout)
+
+
+def get_stats():
+    counts = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hitRate': hits / total if total else None,
+    }
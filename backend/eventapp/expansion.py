@@ -0,0 +1,116 @@
+"""Building per-window occurrence groups for calendar responses.
+
+Shared by CalendarView and its async variant. Expanding loaded events is
+pure CPU work, so the async views run it on a bounded thread pool in
+batches of events (see expand_windows_concurrently), which keeps the event
+loop serving other requests while one large calendar is built.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Occurrence
+from .payload import TimestampFormatter, WindowGroups, event_meta
+from .recurrence import iter_occurrences, resolve_occurrence
+
+# Events expanded per pool task
+EXPANSION_BATCH_SIZE = 200
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def window_ranges(windows):
+    """Merge overlapping windows into [start, end, member indexes] ranges"""
+    ranges = []
+    for i in sorted(range(len(windows)), key=lambda i: windows[i]):
+        start, end = windows[i]
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+            ranges[-1][2].append(i)
+        else:
+            ranges.append([start, end, [i]])
+    return ranges
+
+
+def expand_windows(events, overrides, windows):
+    """Expand events over several windows at once.
+
+    Each event is expanded once over the union of the windows (overlapping
+    windows are merged); occurrences are then split into per-window groups.
+    `overrides` maps (event_id, original_start) to OccurrenceOverride rows.
+    """
+    buckets = [WindowGroups() for _ in windows]
+    fmt = TimestampFormatter()
+    ranges = window_ranges(windows)
+
+    for event in events:
+        meta = partial(event_meta, event)
+        for range_start, range_end, members in ranges:
+            for occ in iter_occurrences(event, range_start, range_end):
+                resolved = resolve_occurrence(event, occ, overrides.get((event.id, occ)))
+                if resolved is None:
+                    continue  # Skip cancelled occurrences
+
+                occ_start, occ_end = resolved
+                row = (fmt(occ_start), fmt(occ_end), fmt(occ))
+                for i in members:
+                    if windows[i][0] <= occ <= windows[i][1]:
+                        buckets[i].add(event.id, meta, row)
+
+    return [bucket.freeze() for bucket in buckets]
+
+
+def materialized_windows(user, windows):
+    """Answer from the pre-expanded Occurrence table with one range query.
+
+    Like expand_windows(), an occurrence belongs to the windows containing
+    its original start, wherever an override moved it.
+    """
+    in_windows = Q()
+    for start, end in windows:
+        in_windows |= Q(original_start__gte=start, original_start__lte=end)
+    occurrences = (
+        Occurrence.objects
+        .filter(in_windows, user=user)
+        .select_related('event')
+        .only('start', 'end', 'original_start', 'event__title', 'event__description', 'event__is_recurring')
+        .order_by('event_id', 'original_start')
+    )
+    buckets = [WindowGroups() for _ in windows]
+    fmt = TimestampFormatter()
+    for occ in occurrences:
+        row = (fmt(occ.start), fmt(occ.end), fmt(occ.original_start))
+        for bucket, (start, end) in zip(buckets, windows):
+            if start <= occ.original_start <= end:
+                bucket.add(occ.event_id, partial(event_meta, occ.event), row)
+    return [bucket.freeze() for bucket in buckets]
+
+
+def get_pool():
+    """The process-wide expansion pool, sized by CALENDAR_EXPANSION_WORKERS"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CALENDAR_EXPANSION_WORKERS', 4),
+                thread_name_prefix='calendar-expansion',
+            )
+        return _pool
+
+
+async def run_in_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), partial(func, *args))
+
+
+async def expand_windows_concurrently(events, overrides, windows, batch_size=EXPANSION_BATCH_SIZE):
+    """expand_windows() over batches of events run side by side on the pool"""
+    batches = [events[i:i + batch_size] for i in range(0, len(events), batch_size)]
+    results = await asyncio.gather(*(run_in_pool(expand_windows, batch, overrides, windows) for batch in batches))
+    # Each event lives in one batch, so per-window groups simply concatenate
+    return [list(chain.from_iterable(result[i] for result in results)) for i in range(len(windows))]
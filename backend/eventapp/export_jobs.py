@@ -0,0 +1,194 @@
+"""Background .ics exports written to files.
+
+Creating an export stores an ExportJob row; the `run_export_jobs` command
+claims pending rows, streams the calendar into a file under EXPORT_ROOT and
+marks the job done, so no web worker is held while a large calendar is
+generated. The database is the queue: jobs are claimed with SELECT ... FOR
+UPDATE SKIP LOCKED plus a conditional UPDATE (SQLite ignores the former),
+so several workers can run side by side without a broker. A claim is the
+job's started_at: the running worker refreshes it periodically, and a job
+whose heartbeat stops is claimed again. Each claim writes its own partial
+file and only stores its result while started_at is still its own, so a
+worker that was presumed lost cannot overwrite its successor's export.
+
+A job is reused by later requests for the same window and mode while the
+user's calendar_version is unchanged, so repeated exports share one file.
+"""
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import ical
+from .models import Event, ExportJob, OccurrenceOverride, User
+from .parallel_export import iter_chunks, stream_parallel
+
+# Seconds between refreshes of a running job's started_at
+HEARTBEAT_INTERVAL = 60
+
+# Running jobs without a heartbeat for this long are assumed lost with their worker
+STALE_AFTER = timedelta(minutes=10)
+
+
+class ClaimLost(Exception):
+    """Another worker claimed the job after this one's heartbeat went stale"""
+
+
+def stream_export(user, start, end, mode, workers=1):
+    """Yield the .ics export of a user's events in [start, end].
+
+    `mode` is 'occurrences' or 'series'. With workers other than 1 the
+    events are rendered by worker processes (None: EXPORT_PROCESSES).
+    """
+    events = Event.objects.overlapping(user, start, end)
+    if workers != 1:
+        return stream_parallel(events, mode, start, end, workers)
+    if mode == 'series':
+        # One VEVENT per series with RRULE/EXDATE/RECURRENCE-ID
+        return ical.stream_series(
+            (chunk, _by_event(overrides)) for chunk, overrides in _event_chunks(events)
+        )
+    # One VEVENT per occurrence
+    return ical.stream_occurrences((
+        (chunk, {(o.event_id, o.original_start): o for o in overrides})
+        for chunk, overrides in _event_chunks(events, start, end)
+    ), start, end)
+
+
+def _event_chunks(events, start=None, end=None):
+    """Yield (events, overrides) for consecutive chunks of an Event queryset.
+
+    Overrides are loaded one chunk at a time, limited to original starts in
+    [start, end] when a window is given.
+    """
+    for chunk in iter_chunks(events.iterator(chunk_size=ical.EXPORT_CHUNK_SIZE), ical.EXPORT_CHUNK_SIZE):
+        overrides = OccurrenceOverride.objects.filter(event__in=[event.pk for event in chunk])
+        if start is not None:
+            overrides = overrides.filter(original_start__gte=start, original_start__lte=end)
+        yield chunk, overrides
+
+
+def _by_event(overrides):
+    by_event = defaultdict(list)
+    for override in overrides:
+        by_event[override.event_id].append(override)
+    return by_event
+
+
+def job_path(job):
+    return os.path.join(settings.EXPORT_ROOT, str(job.user_id), f'export-{job.pk}.ics')
+
+
+def request_export(user, start, end, mode='occurrences'):
+    """The job exporting this window of the user's current calendar, and whether it is new"""
+    with transaction.atomic():
+        # Locking the user row serializes concurrent requests, so only one creates the job
+        version = User.objects.select_for_update().values_list('calendar_version', flat=True).get(pk=user.pk)
+        existing = (
+            ExportJob.objects
+            .filter(user=user, calendar_version=version, start=start, end=end, mode=mode)
+            .exclude(status=ExportJob.FAILED)
+            .order_by('-created_at')
+            .first()
+        )
+        if existing is not None:
+            return existing, False
+        job = ExportJob.objects.create(user=user, start=start, end=end, mode=mode, calendar_version=version)
+    return job, True
+
+
+def claim_next_job():
+    """Mark the oldest pending (or abandoned) job as running and return it, or None"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            ExportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(status=ExportJob.PENDING) | Q(status=ExportJob.RUNNING, started_at__lt=now - STALE_AFTER))
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        claimed = ExportJob.objects.filter(pk=job.pk, status=job.status, started_at=job.started_at).update(
+            status=ExportJob.RUNNING, started_at=now,
+        )
+    if not claimed:
+        return claim_next_job()  # Another worker got there first
+    job.status, job.started_at = ExportJob.RUNNING, now
+    return job
+
+
+def _claimed(job):
+    return ExportJob.objects.filter(pk=job.pk, status=ExportJob.RUNNING, started_at=job.started_at)
+
+
+def heartbeat(job):
+    """Refresh a running job's claim; raises ClaimLost once another worker holds it"""
+    now = timezone.now()
+    if not _claimed(job).update(started_at=now):
+        raise ClaimLost(job.pk)
+    job.started_at = now
+
+
+def _finish(job, status, size=None, error=''):
+    """Store a job's outcome unless its claim was lost; the row stays locked until commit"""
+    if _claimed(job).select_for_update().first() is None:
+        raise ClaimLost(job.pk)
+    job.status, job.size, job.error, job.finished_at = status, size, error, timezone.now()
+    job.save(update_fields=['status', 'size', 'error', 'finished_at'])
+
+
+def run_job(job, workers=1):
+    """Write a claimed job's export to its file, then mark it done or failed.
+
+    Returns the job, or None when another worker claimed it in the meantime.
+    """
+    path = job_path(job)
+    partial_path = f'{path}.{uuid.uuid4().hex}.part'
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        last_beat = time.monotonic()
+        with open(partial_path, 'wb') as output:
+            for chunk in stream_export(job.user_id, job.start, job.end, job.mode, workers):
+                output.write(chunk)
+                if time.monotonic() - last_beat >= HEARTBEAT_INTERVAL:
+                    heartbeat(job)
+                    last_beat = time.monotonic()
+        with transaction.atomic():
+            _finish(job, ExportJob.DONE, size=os.path.getsize(partial_path))
+            # Readers only ever see complete files
+            os.replace(partial_path, path)
+    except ClaimLost:
+        return None
+    except Exception as e:
+        try:
+            with transaction.atomic():
+                _finish(job, ExportJob.FAILED, error=f'{type(e).__name__}: {e}')
+        except ClaimLost:
+            return None
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return job
+
+
+def purge_jobs(finished_before):
+    """Delete finished or failed jobs, and their files, that ended before a time"""
+    jobs = ExportJob.objects.filter(
+        status__in=[ExportJob.DONE, ExportJob.FAILED], finished_at__lt=finished_before,
+    )
+    purged = 0
+    for job in jobs.iterator():
+        path = job_path(job)
+        if os.path.exists(path):
+            os.remove(path)
+        job.delete()
+        purged += 1
+    return purged
@@ -0,0 +1,214 @@
+"""Free/busy blocks and conflict detection over expanded occurrences.
+
+Busy intervals are a user's resolved (override-applied) occurrences in a
+window, sorted once by start. Merging them into busy blocks is then a single
+sweep, and overlaps with a set of candidate intervals are found with a
+sweep-line over both lists, so either costs O(n log n) plus the number of
+overlaps reported. Common free slots of several users come from a heap
+merge of their sorted busy lists, swept the same way.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+from .models import Event, OccurrenceOverride
+from .recurrence import get_override_index, iter_occurrences, resolve_occurrence
+
+# How far ahead the occurrences of a series being saved are checked
+CONFLICT_HORIZON = timedelta(days=365)
+
+MAX_REPORTED_CONFLICTS = 20
+
+WORKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR')
+
+WEEKDAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+
+def expand_busy(events, overrides, start, end):
+    """Occurrences of events overlapping [start, end) as sorted (start, end, event).
+
+    Each series is expanded from one event duration before the window, so
+    occurrences that began earlier but are still running count as busy.
+    `overrides` maps (event_id, original_start) to OccurrenceOverride rows.
+    """
+    intervals = []
+    for event in events:
+        for occ in iter_occurrences(event, start - (event.end - event.start), end):
+            resolved = resolve_occurrence(event, occ, overrides.get((event.id, occ)))
+            if resolved is None:
+                continue  # Skip cancelled occurrences
+            occ_start, occ_end = resolved
+            if occ_start < end and occ_end > start:
+                intervals.append((occ_start, occ_end, event))
+    intervals.sort(key=lambda interval: (interval[0], interval[1], interval[2].id))
+    return intervals
+
+
+def busy_intervals(user, start, end, exclude=None):
+    """A user's occurrences overlapping [start, end); see expand_busy().
+
+    `exclude` is an event id to leave out, e.g. the event being edited.
+    """
+    events = Event.objects.overlapping(user, start, end)
+    if exclude is not None:
+        events = events.exclude(pk=exclude)
+    events = list(events)
+    if not events:
+        return []
+    lookback = max(event.end - event.start for event in events)
+    return expand_busy(events, get_override_index(user, start - lookback, end), start, end)
+
+
+def participant_busy(users, start, end):
+    """Busy intervals of several users, one sorted list per user, in two queries"""
+    events = list(Event.objects.active_between(start, end).filter(user__in=users))
+    if not events:
+        return {}
+    lookback = max(event.end - event.start for event in events)
+    overrides = OccurrenceOverride.objects.filter(
+        event__in=[event.pk for event in events],
+        original_start__gte=start - lookback,
+        original_start__lte=end,
+    )
+    override_index = {(o.event_id, o.original_start): o for o in overrides}
+
+    by_user = defaultdict(list)
+    for event in events:
+        by_user[event.user_id].append(event)
+    return {
+        user_id: expand_busy(user_events, override_index, start, end)
+        for user_id, user_events in by_user.items()
+    }
+
+
+def iter_merged(intervals):
+    """Lazily merge (start, end, ...) intervals sorted by start into disjoint (start, end) blocks"""
+    block_start = block_end = None
+    for start, end, *_ in intervals:
+        if block_end is not None and start <= block_end:
+            if end > block_end:
+                block_end = end
+            continue
+        if block_end is not None:
+            yield block_start, block_end
+        block_start, block_end = start, end
+    if block_end is not None:
+        yield block_start, block_end
+
+
+def merge_intervals(intervals):
+    return list(iter_merged(intervals))
+
+
+def free_blocks(busy, start, end):
+    """The gaps in [start, end) between merged busy blocks"""
+    free = []
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_start > cursor:
+            free.append((cursor, min(busy_start, end)))
+        cursor = max(cursor, busy_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        free.append((cursor, end))
+    return free
+
+
+def get_free_busy(user, start, end):
+    """Merged busy blocks and the free time between them, clipped to [start, end)"""
+    busy = [
+        (max(busy_start, start), min(busy_end, end))
+        for busy_start, busy_end in merge_intervals(busy_intervals(user, start, end))
+    ]
+    return busy, free_blocks(busy, start, end)
+
+
+def working_intervals(start, end, day_start, day_end, tz, weekdays=WORKDAYS):
+    """Working hours in [start, end): day_start to day_end local time on the given weekdays"""
+    intervals = []
+    day = start.astimezone(tz).date()
+    last_day = end.astimezone(tz).date()
+    while day <= last_day:
+        if WEEKDAY_CODES[day.weekday()] in weekdays:
+            opens = datetime.combine(day, day_start, tzinfo=tz)
+            closes = datetime.combine(day, day_end, tzinfo=tz)
+            opens, closes = max(opens, start), min(closes, end)
+            if opens < closes:
+                intervals.append((opens, closes))
+        day += timedelta(days=1)
+    return intervals
+
+
+def find_common_slots(busy_lists, working, duration, limit, step=None):
+    """The first `limit` slots of `duration` inside `working` where nobody is busy.
+
+    busy_lists holds one start-sorted interval list per participant; they
+    are combined with a heap merge and swept lazily into disjoint busy
+    blocks, so the search stops reading once enough slots are found.
+    Within a free stretch, slots start every `step` (default `duration`);
+    after a busy block the next slot starts when it ends.
+    """
+    step = step or duration
+    blocks = iter_merged(heapq.merge(*busy_lists, key=itemgetter(0)))
+    block = next(blocks, None)
+    slots = []
+    for window_start, window_end in working:
+        cursor = window_start
+        while cursor + duration <= window_end:
+            while block is not None and block[1] <= cursor:
+                block = next(blocks, None)
+            if block is not None and block[0] < cursor + duration:
+                cursor = block[1]  # Busy: resume once this block ends
+                continue
+            slots.append((cursor, cursor + duration))
+            if len(slots) == limit:
+                return slots
+            cursor += step
+    return slots
+
+
+def find_overlaps(candidates, busy):
+    """Overlapping (candidate, busy) pairs of two lists of (start, end, ...) intervals.
+
+    Both lists are swept together in start order; each keeps a heap of its
+    intervals that are still running, keyed by end. An interval that starts
+    overlaps every running interval of the other list.
+    """
+    tagged = sorted(
+        [(interval[0], 0, i) for i, interval in enumerate(candidates)]
+        + [(interval[0], 1, i) for i, interval in enumerate(busy)]
+    )
+    lists = (candidates, busy)
+    running = ([], [])
+    overlaps = []
+    for start, side, i in tagged:
+        for heap in running:
+            while heap and heap[0][0] <= start:
+                heapq.heappop(heap)
+        for _, j in running[1 - side]:
+            pair = (i, j) if side == 0 else (j, i)
+            overlaps.append((candidates[pair[0]], busy[pair[1]]))
+        heapq.heappush(running[side], (lists[side][i][1], i))
+    return overlaps
+
+
+def event_conflicts(user, event, exclude=None, horizon=CONFLICT_HORIZON):
+    """Occurrences of a (possibly unsaved) event that overlap the user's other events.
+
+    Returns (candidate, busy) pairs of (start, end, event) intervals, ordered
+    by the candidate's start. Series are checked up to `horizon` past their
+    first occurrence; overrides of the event itself are not applied.
+    """
+    duration = event.end - event.start
+    candidates = [
+        (occ, occ + duration, event)
+        for occ in iter_occurrences(event, event.start, event.start + horizon)
+    ]
+    if not candidates:
+        return []
+    busy = busy_intervals(user, candidates[0][0], candidates[-1][1], exclude=exclude)
+    overlaps = find_overlaps(candidates, busy)
+    overlaps.sort(key=lambda pair: (pair[0][0], pair[1][0], pair[1][2].id))
+    return overlaps
@@ -0,0 +1,188 @@
+"""iCalendar (.ics) serialization helpers for the export views"""
+from datetime import datetime, timedelta
+
+from dateutil.rrule import rrulestr
+from icalendar import Calendar, Event as ICalEvent, vRecur
+
+from .recurrence import WEEKDAY_MAP, iter_occurrences, resolve_occurrence
+
+PRODID = '-//Event Scheduler//mxm.dk//'
+CALENDAR_FOOTER = b'END:VCALENDAR\r\n'
+
+# Events fetched per database round trip while streaming an export
+EXPORT_CHUNK_SIZE = 500
+
+WEEKDAY_CODES = sorted(WEEKDAY_MAP, key=WEEKDAY_MAP.get)
+
+
+def new_calendar():
+    """Create an empty VCALENDAR with the scheduler's PRODID"""
+    cal = Calendar()
+    cal.add('prodid', PRODID)
+    cal.add('version', '2.0')
+    return cal
+
+
+def calendar_header():
+    """The serialized VCALENDAR without its closing line"""
+    return new_calendar().to_ical()[:-len(CALENDAR_FOOTER)]
+
+
+def occurrence_component(event, occ, start, end, dtstamp):
+    """A VEVENT for a single occurrence of an event"""
+    ical_event = ICalEvent()
+    ical_event.add('summary', event.title)
+    ical_event.add('description', event.description)
+    ical_event.add('dtstart', start)
+    ical_event.add('dtend', end)
+    ical_event.add('dtstamp', dtstamp)
+    ical_event.add('uid', f'event-{event.id}-{occ.isoformat()}@eventscheduler.com')
+    return ical_event
+
+
+def stream_occurrences(chunks, start, end):
+    """Yield an .ics file chunk by chunk, one VEVENT per occurrence.
+
+    `chunks` yields (events, overrides) pairs: a batch of events and the
+    override index of just that batch, keyed by (event_id, original_start).
+    It is consumed lazily and each VEVENT is serialized as soon as it is
+    generated, so memory use depends on the batch size rather than on the
+    size of the export.
+    """
+    yield calendar_header()
+    dtstamp = datetime.now()
+    for events, overrides in chunks:
+        yield from occurrence_chunks(events, overrides, start, end, dtstamp)
+    yield CALENDAR_FOOTER
+
+
+def occurrence_chunks(events, overrides, start, end, dtstamp):
+    """The serialized VEVENTs of stream_occurrences(), without header and footer"""
+    for event in events:
+        for occ in iter_occurrences(event, start, end):
+            # Skip cancelled occurrences
+            resolved = resolve_occurrence(event, occ, overrides.get((event.id, occ)))
+            if resolved is None:
+                continue
+            yield occurrence_component(event, occ, *resolved, dtstamp).to_ical()
+
+
+def _last_day_rule(day):
+    """BYMONTHDAY/BYSETPOS parts for "day, or the last day of shorter months"
+
+    generate_occurrences clamps a day that a month lacks to its last day,
+    whereas a plain BYMONTHDAY would skip that month.
+    """
+    if day <= 28:
+        return {'BYMONTHDAY': [day]}
+    return {'BYMONTHDAY': list(range(28, day + 1)), 'BYSETPOS': [-1]}
+
+
+def recurrence_rule(event):
+    """The RRULE matching an event's recurrence pattern"""
+    rrule = {'FREQ': event.frequency, 'INTERVAL': event.interval}
+    if event.frequency == 'WEEKLY':
+        if event.weekdays:
+            rrule['BYDAY'] = event.weekdays.split(',')
+        rrule['WKST'] = 'MO'  # weeks are counted from Monday
+    elif event.frequency == 'MONTHLY':
+        if event.month_day:
+            rrule.update(_last_day_rule(event.month_day))
+        elif event.month_week is not None and event.month_weekday is not None:
+            rrule['BYDAY'] = [f'{event.month_week}{WEEKDAY_CODES[event.month_weekday]}']
+        else:
+            rrule.update(_last_day_rule(event.start.day))
+    elif event.frequency == 'YEARLY' and (event.start.month, event.start.day) == (2, 29):
+        rrule.update({'BYMONTH': [2], **_last_day_rule(29)})
+    if event.until:
+        rrule['UNTIL'] = event.until
+    return rrule
+
+
+def series_component(event, dtstamp):
+    """A master VEVENT for an event, with an RRULE when it recurs"""
+    ical_event = ICalEvent()
+    ical_event.add('summary', event.title)
+    ical_event.add('description', event.description)
+    ical_event.add('dtstart', event.start)
+    ical_event.add('dtend', event.end)
+    ical_event.add('dtstamp', dtstamp)
+    ical_event.add('uid', f'event-{event.id}@eventscheduler.com')
+    if event.is_recurring:
+        ical_event.add('rrule', recurrence_rule(event))
+    return ical_event
+
+
+def _rule_extras(event):
+    """Instances the RRULE yields in the first month that the series does not.
+
+    The series' first period holds only event.start, but a monthly RRULE also
+    matches later days of that month.
+    """
+    if event.frequency != 'MONTHLY':
+        return []
+    rule = rrulestr(vRecur(recurrence_rule(event)).to_ical().decode(), dtstart=event.start)
+    next_month = (event.start.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return rule.between(event.start, next_month)
+
+
+def series_components(event, overrides, dtstamp):
+    """A master VEVENT plus EXDATEs and RECURRENCE-ID children for overrides"""
+    master = series_component(event, dtstamp)
+
+    if not event.is_recurring:
+        override = next((o for o in overrides if o.original_start == event.start), None)
+        resolved = resolve_occurrence(event, event.start, override)
+        if resolved is None:
+            return []
+        for name, value in zip(('dtstart', 'dtend'), resolved):
+            del master[name]
+            master.add(name, value)
+        return [master]
+
+    exdates = _rule_extras(event)
+    children = []
+    for override in overrides:
+        occ = override.original_start
+        # Ignore overrides that no longer match an occurrence of the series
+        if next(iter_occurrences(event, occ, occ), None) is None:
+            continue
+        resolved = resolve_occurrence(event, occ, override)
+        if resolved is None:
+            exdates.append(occ)
+        elif resolved != (occ, occ + (event.end - event.start)):
+            child = occurrence_component(event, occ, *resolved, dtstamp)
+            child['uid'] = master['uid']
+            child.add('recurrence-id', occ)
+            children.append(child)
+    if exdates:
+        master.add('exdate', sorted(exdates))
+    return [master] + children
+
+
+def stream_series(chunks):
+    """Yield an .ics file with one master VEVENT per event instead of one per occurrence.
+
+    Like stream_occurrences(), but the overrides of each batch map event ids
+    to their OccurrenceOverride rows.
+    """
+    yield calendar_header()
+    dtstamp = datetime.now()
+    for events, overrides_by_event in chunks:
+        yield from series_chunks(events, overrides_by_event, dtstamp)
+    yield CALENDAR_FOOTER
+
+
+def series_chunks(events, overrides_by_event, dtstamp):
+    """The serialized VEVENTs of stream_series(), without header and footer"""
+    for event in events:
+        for component in series_components(event, overrides_by_event.get(event.id, ()), dtstamp):
+            yield component.to_ical()
+
+
+def event_calendar(event, overrides, dtstamp):
+    """A complete .ics file for one event and its overrides"""
+    cal = new_calendar()
+    for component in series_components(event, overrides, dtstamp):
+        cal.add_component(component)
+    return cal.to_ical()
@@ -0,0 +1,330 @@
+"""Streaming iCalendar (.ics) import.
+
+The file is read line by line and each VEVENT is decoded on its own, so
+memory use depends on the batch size rather than on the size of the file.
+Only the properties the models can hold are decoded, using icalendar's value
+types.
+
+Master VEVENTs become Event rows; EXDATEs and RECURRENCE-ID instances become
+OccurrenceOverride rows of their master, matched by UID. Rows are written
+with batched bulk_create in one transaction, which skips model signals, so
+the calendar version is bumped and materialized occurrences are rebuilt once
+at the end.
+"""
+import re
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from icalendar.prop import vDDDTypes, vDuration, vRecur
+
+from .ical import WEEKDAY_CODES
+from .models import Event, OccurrenceOverride
+from .recurrence import WEEKDAY_MAP, iter_occurrences
+from .signals import refresh_events
+from .versioning import bump_calendar_version
+
+IMPORT_BATCH_SIZE = 1000
+
+# Largest RRULE COUNT accepted; the last occurrence is found by expansion
+MAX_RULE_COUNT = 10000
+
+# Length given to timed VEVENTs that have neither DTEND nor DURATION
+DEFAULT_DURATION = timedelta(hours=1)
+
+SUPPORTED_RULE_PARTS = {'FREQ', 'INTERVAL', 'UNTIL', 'COUNT', 'BYDAY', 'BYMONTHDAY', 'BYSETPOS', 'BYMONTH', 'WKST'}
+
+PARAM = re.compile(r';([^=;]+)=("[^"]*"|[^;]*)')
+
+TEXT_ESCAPE = re.compile(r'\\([\\;,nN])')
+
+NTH_WEEKDAY = re.compile(r'([+-]?[1-5])(MO|TU|WE|TH|FR|SA|SU)')
+
+
+class UnsupportedComponent(ValueError):
+    """A VEVENT that cannot be represented by Event/OccurrenceOverride fields"""
+
+
+def iter_content_lines(stream):
+    """Unfold an .ics byte stream into content lines"""
+    pending = None
+    for raw in stream:
+        line = raw.rstrip(b'\r\n')
+        if line[:1] in (b' ', b'\t') and pending is not None:
+            # Folds may split a multi-byte character, so decode after unfolding
+            pending += line[1:]
+            continue
+        if pending:
+            yield pending.decode('utf-8', errors='replace')
+        pending = line
+    if pending:
+        yield pending.decode('utf-8', errors='replace')
+
+
+def split_content_line(line):
+    """(NAME, {PARAM: value}, value) for one content line"""
+    colon = line.find(':')
+    if colon < 0:
+        raise ValueError(f'Malformed content line: {line!r}')
+    if '"' in line[:colon]:
+        # Quoted parameter values may contain ':'
+        quoted = False
+        for colon, char in enumerate(line):
+            if char == '"':
+                quoted = not quoted
+            elif char == ':' and not quoted:
+                break
+    name, _, params = line[:colon].partition(';')
+    params = {key.upper(): param.strip('"') for key, param in PARAM.findall(';' + params)} if params else {}
+    return name.upper(), params, line[colon + 1:]
+
+
+def iter_vevents(stream):
+    """Yield the properties of each VEVENT in an .ics byte stream, one VEVENT at a time.
+
+    Each VEVENT is a dict mapping property names to lists of (params, value)
+    pairs with values still undecoded; properties of nested components such
+    as VALARM are dropped. Building full icalendar components costs several
+    times more than the import itself.
+    """
+    props, depth = None, 0
+    for line in iter_content_lines(stream):
+        try:
+            name, params, value = split_content_line(line)
+        except ValueError:
+            continue
+        if props is None:
+            if name == 'BEGIN' and value.upper() == 'VEVENT':
+                props, depth = {}, 0
+        elif name == 'BEGIN':
+            depth += 1
+        elif name == 'END' and depth:
+            depth -= 1
+        elif name == 'END':
+            yield props
+            props = None
+        elif not depth:
+            props.setdefault(name, []).append((params, value))
+
+
+def to_datetime(value, tz):
+    """Aware datetime for a DATE or DATE-TIME value; floating times use tz"""
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, tz)
+    return value
+
+
+def _month_day(parts):
+    """BYMONTHDAY as a single day, including ical.recurrence_rule's clamped form"""
+    days = [int(day) for day in parts['BYMONTHDAY']]
+    if len(days) == 1 and 'BYSETPOS' not in parts and 1 <= days[0] <= 31:
+        return days[0]
+    if parts.get('BYSETPOS') == [-1] and days == list(range(28, days[-1] + 1)) and days[-1] <= 31:
+        return days[-1]
+    raise UnsupportedComponent('BYMONTHDAY must name a single day')
+
+
+def rule_fields(rrule, start, tz):
+    """Event recurrence fields for an RRULE; raises UnsupportedComponent"""
+    parts = {key.upper(): value if isinstance(value, list) else [value] for key, value in rrule.items()}
+    unsupported = set(parts) - SUPPORTED_RULE_PARTS
+    if unsupported:
+        raise UnsupportedComponent(f"Unsupported RRULE parts: {', '.join(sorted(unsupported))}")
+
+    frequency = parts.get('FREQ', [None])[0]
+    if frequency not in dict(Event.FREQUENCY_CHOICES):
+        raise UnsupportedComponent(f'Unsupported frequency: {frequency}')
+    fields = {'is_recurring': True, 'frequency': frequency, 'interval': int(parts.get('INTERVAL', [1])[0])}
+    if fields['interval'] < 1:
+        raise UnsupportedComponent('INTERVAL must be at least 1')
+    count = int(parts['COUNT'][0]) if 'COUNT' in parts else None
+    if count is not None and not 1 <= count <= MAX_RULE_COUNT:
+        raise UnsupportedComponent(f'COUNT must be between 1 and {MAX_RULE_COUNT}')
+    byday = [str(day) for day in parts.get('BYDAY', [])]
+
+    if 'BYSETPOS' in parts and 'BYMONTHDAY' not in parts:
+        raise UnsupportedComponent('BYSETPOS is only supported with BYMONTHDAY')
+    if frequency in ('DAILY', 'WEEKLY') and ('BYMONTHDAY' in parts or 'BYMONTH' in parts):
+        raise UnsupportedComponent(f'BYMONTHDAY/BYMONTH are not supported for {frequency} rules')
+
+    if frequency == 'WEEKLY':
+        days = byday or [WEEKDAY_CODES[start.weekday()]]
+        if any(day not in WEEKDAY_MAP for day in days):
+            raise UnsupportedComponent('Weekly BYDAY must list plain weekdays')
+        fields['weekdays'] = ','.join(days)
+    elif frequency == 'MONTHLY':
+        if 'BYMONTH' in parts:
+            raise UnsupportedComponent('BYMONTH is not supported for MONTHLY rules')
+        if byday:
+            match = NTH_WEEKDAY.fullmatch(byday[0]) if len(byday) == 1 else None
+            if not match or 'BYMONTHDAY' in parts:
+                raise UnsupportedComponent('Monthly BYDAY must be a single nth weekday')
+            fields['month_week'], fields['month_weekday'] = int(match[1]), WEEKDAY_MAP[match[2]]
+        else:
+            fields['month_day'] = _month_day(parts) if 'BYMONTHDAY' in parts else start.day
+    elif byday:
+        raise UnsupportedComponent(f'BYDAY is not supported for {frequency} rules')
+    elif frequency == 'YEARLY':
+        if parts.get('BYMONTH', [start.month]) != [start.month]:
+            raise UnsupportedComponent('Yearly rules must repeat on the start month')
+        if 'BYMONTHDAY' in parts and _month_day(parts) != start.day:
+            raise UnsupportedComponent('Yearly rules must repeat on the start day')
+
+    if 'UNTIL' in parts:
+        until = parts['UNTIL'][0]
+        if not isinstance(until, datetime):
+            # A DATE bound includes the whole day
+            until = to_datetime(until + timedelta(days=1), tz) - timedelta(microseconds=1)
+        fields['until'] = to_datetime(until, tz)
+    return fields, count
+
+
+def _datetime(params, value, tz):
+    return to_datetime(vDDDTypes.from_ical(value, timezone=params.get('TZID')), tz)
+
+
+def _text(props, name):
+    if name not in props:
+        return ''
+    return TEXT_ESCAPE.sub(lambda m: '\n' if m[1] in 'nN' else m[1], props[name][0][1])
+
+
+def _value_times(props, tz):
+    params, value = props['DTSTART'][0]
+    start_value = vDDDTypes.from_ical(value, timezone=params.get('TZID'))
+    start = to_datetime(start_value, tz)
+    if 'DTEND' in props:
+        end = _datetime(*props['DTEND'][0], tz)
+    elif 'DURATION' in props:
+        end = start + vDuration.from_ical(props['DURATION'][0][1])
+    elif isinstance(start_value, datetime):
+        end = start + DEFAULT_DURATION
+    else:
+        end = start + timedelta(days=1)  # all-day event
+    return start, end
+
+
+def _exdates(props, tz):
+    for params, value in props.get('EXDATE', ()):
+        for item in value.split(','):
+            yield _datetime(params, item, tz)
+
+
+class IcsImporter:
+    """Imports VEVENTs from .ics byte streams into one user's calendar"""
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.tz = timezone.get_current_timezone()
+        self.event_ids = {}  # UID -> pk of the imported master
+        self.pending_events = []  # (uid, Event, exdates)
+        self.pending_overrides = []  # (uid, original_start, override fields) of RECURRENCE-ID instances
+        self.ready_overrides = []  # OccurrenceOverride rows with a known event
+        self.created_ids = []
+        self.counts = {'events': 0, 'overrides': 0, 'skipped': 0}
+
+    def run(self, stream):
+        """Import every VEVENT of `stream`; returns counts and throughput"""
+        started = time.perf_counter()
+        with transaction.atomic():
+            for props in iter_vevents(stream):
+                try:
+                    self.add(props)
+                except (UnsupportedComponent, ValueError, KeyError, TypeError):
+                    self.counts['skipped'] += 1
+                if len(self.pending_events) >= self.batch_size:
+                    self.flush_events()
+                if len(self.ready_overrides) >= self.batch_size:
+                    self.flush_overrides()
+            self.flush_events()
+            self.flush_overrides()
+            # Instances whose master never appeared
+            self.counts['skipped'] += len(self.pending_overrides)
+
+            if self.created_ids:
+                bump_calendar_version(self.user.pk)
+                refresh_events(self.created_ids)
+
+        seconds = time.perf_counter() - started
+        return {
+            **self.counts,
+            'seconds': round(seconds, 3),
+            'eventsPerSecond': round(self.counts['events'] / seconds) if seconds else None,
+        }
+
+    def add(self, props):
+        """Queue the Event or override for one VEVENT, as read by iter_vevents"""
+        uid = props['UID'][0][1] if 'UID' in props else None
+        start, end = _value_times(props, self.tz)
+
+        if 'RECURRENCE-ID' in props:
+            original = _datetime(*props['RECURRENCE-ID'][0], self.tz)
+            if _text(props, 'STATUS').upper() == 'CANCELLED':
+                fields = {'is_cancelled': True}
+            else:
+                fields = {'new_start': start, 'new_end': end}
+            if not self.add_override(uid, original, fields):
+                self.pending_overrides.append((uid, original, fields))
+            return
+
+        event = Event(
+            user=self.user,
+            title=_text(props, 'SUMMARY')[:255],
+            description=_text(props, 'DESCRIPTION'),
+            start=start,
+            end=end,
+        )
+        if 'RRULE' in props:
+            fields, count = rule_fields(vRecur.from_ical(props['RRULE'][0][1]), start, self.tz)
+            for name, value in fields.items():
+                setattr(event, name, value)
+            if count is not None:
+                last = deque(iter_occurrences(event, start, limit=count), maxlen=1)
+                event.until = last[0] if last else start
+        self.pending_events.append((uid, event, list(_exdates(props, self.tz))))
+
+    def flush_events(self):
+        if not self.pending_events:
+            return
+        created = Event.objects.bulk_create([event for _, event, _ in self.pending_events])
+        for uid, event, exdates in self.pending_events:
+            self.created_ids.append(event.pk)
+            if uid is not None:
+                self.event_ids[uid] = event.pk
+            self.ready_overrides.extend(
+                OccurrenceOverride(event_id=event.pk, original_start=occ, is_cancelled=True) for occ in exdates
+            )
+        self.counts['events'] += len(created)
+        self.pending_events = []
+
+        # Instances that arrived before their master
+        self.pending_overrides = [item for item in self.pending_overrides if not self.add_override(*item)]
+
+    def add_override(self, uid, original, fields):
+        """Queue an instance override; returns False while its master is not imported"""
+        event_id = self.event_ids.get(uid)
+        if event_id is None:
+            return False
+        self.ready_overrides.append(OccurrenceOverride(event_id=event_id, original_start=original, **fields))
+        return True
+
+    def flush_overrides(self):
+        if not self.ready_overrides:
+            return
+        # EXDATE and a cancelled RECURRENCE-ID may name the same instance, so
+        # count the rows ignore_conflicts actually kept
+        stored = OccurrenceOverride.objects.filter(event_id__in={o.event_id for o in self.ready_overrides})
+        before = stored.count()
+        OccurrenceOverride.objects.bulk_create(self.ready_overrides, batch_size=self.batch_size, ignore_conflicts=True)
+        self.counts['overrides'] += stored.count() - before
+        self.ready_overrides = []
+
+
+def import_ics(user, stream, batch_size=IMPORT_BATCH_SIZE):
+    """Import an .ics byte stream into user's calendar"""
+    return IcsImporter(user, batch_size).run(stream)
@@ -0,0 +1,99 @@
+import random
+import timeit
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from eventapp.freebusy import expand_busy, find_common_slots, working_intervals
+from eventapp.models import Event
+
+
+def naive_slots(busy_lists, working, duration, limit, step):
+    """Try every slot against every participant's busy list.
+
+    Kept here only as a baseline for the benchmark.
+    """
+    slots = []
+    for window_start, window_end in working:
+        cursor = window_start
+        while cursor + duration <= window_end:
+            slot_end = cursor + duration
+            if not any(start < slot_end and end > cursor for busy in busy_lists for start, end, _ in busy):
+                slots.append((cursor, slot_end))
+                if len(slots) == limit:
+                    return slots
+            cursor += step
+    return slots
+
+
+def participant_events(rng, first_pk, window_start):
+    """A plausible mix of daily, weekly and monthly series for one person"""
+    base = window_start - timedelta(days=60)
+    specs = [
+        ('DAILY', {}, 9, 15),
+        ('WEEKLY', {'weekdays': rng.choice(['MO', 'TU'])}, rng.randrange(10, 16), 60),
+        ('WEEKLY', {'weekdays': rng.choice(['WE', 'TH'])}, rng.randrange(10, 16), 45),
+        ('WEEKLY', {'weekdays': 'FR'}, rng.randrange(13, 16), 30),
+        ('MONTHLY', {'month_day': rng.randrange(1, 28)}, rng.randrange(9, 16), 120),
+    ]
+    events = []
+    for offset, (frequency, rule, hour, minutes) in enumerate(specs):
+        start = base + timedelta(hours=hour, minutes=rng.choice([0, 15, 30]))
+        events.append(Event(
+            pk=first_pk + offset,
+            title=f'{frequency.title()} meeting',
+            start=start,
+            end=start + timedelta(minutes=minutes),
+            is_recurring=True,
+            frequency=frequency,
+            interval=1,
+            **rule,
+        ))
+    return events
+
+
+class Command(BaseCommand):
+    help = 'Time the multi-user availability search against a per-slot baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--participants', type=int, default=50)
+        parser.add_argument('--window-days', type=int, default=31)
+        parser.add_argument('--slots', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        window_start = timezone.make_aware(datetime(2025, 6, 2))
+        window_end = window_start + timedelta(days=options['window_days'])
+        duration, step = timedelta(minutes=60), timedelta(minutes=15)
+        working = working_intervals(window_start, window_end, time(9), time(17), window_start.tzinfo)
+        participants = [
+            participant_events(rng, i * 10, window_start) for i in range(options['participants'])
+        ]
+        repeat, limit = options['repeat'], options['slots']
+
+        def expand():
+            return [expand_busy(events, {}, window_start, window_end) for events in participants]
+
+        busy_lists = expand()
+        occurrences = sum(len(busy) for busy in busy_lists)
+        slots = find_common_slots(busy_lists, working, duration, limit, step)
+        # Events sit on the quarter-hour grid, so both searches agree
+        assert slots == naive_slots(busy_lists, working, duration, limit, step)
+
+        times = [
+            timeit.timeit(expand, number=repeat),
+            timeit.timeit(lambda: find_common_slots(busy_lists, working, duration, limit, step), number=repeat),
+            timeit.timeit(lambda: naive_slots(busy_lists, working, duration, limit, step), number=repeat),
+        ]
+        self.stdout.write(
+            f"{options['participants']} participants, {occurrences} occurrences over "
+            f"{options['window_days']} days, first {len(slots)} slots"
+        )
+        self.stdout.write(f"{'expand (ms)':>12}{'heap sweep (ms)':>17}{'per-slot scan (ms)':>20}")
+        self.stdout.write(
+            f"{times[0] / repeat * 1000:>12.2f}{times[1] / repeat * 1000:>17.2f}{times[2] / repeat * 1000:>20.2f}"
+        )
+        for start, end in slots:
+            self.stdout.write(f'  {start.isoformat()} - {end.isoformat()}')
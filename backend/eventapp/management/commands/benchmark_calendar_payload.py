@@ -0,0 +1,96 @@
+import timeit
+from datetime import datetime, timedelta
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from eventapp.models import Event
+from eventapp.payload import CalendarJSONRenderer, CalendarPayload, TimestampFormatter, WindowGroups, event_meta
+from eventapp.recurrence import iter_occurrences
+
+
+def dict_payload(events, start, end):
+    """One dict per occurrence, as CalendarView used to build.
+
+    Kept here only as a baseline for the benchmark.
+    """
+    results = []
+    for event in events:
+        for occ in iter_occurrences(event, start, end):
+            results.append({
+                'id': event.id,
+                'title': event.title,
+                'description': event.description,
+                'start': occ.isoformat(),
+                'end': (occ + (event.end - event.start)).isoformat(),
+                'isRecurring': event.is_recurring,
+                'originalStart': occ.isoformat(),
+            })
+    return results
+
+
+def grouped_payload(events, start, end):
+    groups = WindowGroups()
+    fmt = TimestampFormatter()
+    for event in events:
+        meta = partial(event_meta, event)
+        for occ in iter_occurrences(event, start, end):
+            groups.add(event.id, meta, (fmt(occ), fmt(occ + (event.end - event.start)), fmt(occ)))
+    return groups.freeze()
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-occurrence dict payload with the grouped calendar payloads'
+
+    EVENT_COUNTS = [10, 100, 500]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-days', type=int, default=31)
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        window_start = timezone.make_aware(datetime(2025, 6, 1))
+        window_end = window_start + timedelta(days=options['window_days'])
+        repeat = options['repeat']
+        json_renderer, calendar_renderer = JSONRenderer(), CalendarJSONRenderer()
+
+        self.stdout.write(
+            f"{'events':>8}{'occurrences':>13}{'dicts (ms)':>12}{'flat (ms)':>11}{'grouped (ms)':>14}"
+            f"{'dicts (KB)':>12}{'flat (KB)':>11}{'grouped (KB)':>14}"
+        )
+        for count in self.EVENT_COUNTS:
+            events = [
+                Event(
+                    pk=pk,
+                    title=f'Team sync {pk}',
+                    description='Weekly status update with the whole team. ' * 3,
+                    start=window_start - timedelta(days=90, hours=-9 - pk % 8),
+                    end=window_start - timedelta(days=90, hours=-10 - pk % 8),
+                    is_recurring=True,
+                    frequency='DAILY',
+                    interval=1,
+                )
+                for pk in range(1, count + 1)
+            ]
+
+            def dicts():
+                return json_renderer.render(dict_payload(events, window_start, window_end))
+
+            def render(shape):
+                payload = CalendarPayload(grouped_payload(events, window_start, window_end), shape)
+                return calendar_renderer.render(payload)
+
+            sizes = [len(dicts()), len(render('flat')), len(render('grouped'))]
+            times = [
+                timeit.timeit(dicts, number=repeat),
+                timeit.timeit(lambda: render('flat'), number=repeat),
+                timeit.timeit(lambda: render('grouped'), number=repeat),
+            ]
+            occurrences = sum(len(rows) for _, rows in grouped_payload(events, window_start, window_end))
+            self.stdout.write(
+                f"{count:>8}{occurrences:>13}"
+                f"{times[0] / repeat * 1000:>12.2f}{times[1] / repeat * 1000:>11.2f}{times[2] / repeat * 1000:>14.2f}"
+                f"{sizes[0] / 1024:>12.1f}{sizes[1] / 1024:>11.1f}{sizes[2] / 1024:>14.1f}"
+            )
@@ -0,0 +1,64 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from eventapp import ical
+from eventapp.models import Event
+from eventapp.parallel_export import CHUNK_SIZE, EVENT_FIELDS, init_worker, iter_chunks, map_in_order, render_chunk
+
+
+def event_rows(count, window_start):
+    """Plain tuples of EVENT_FIELDS for a mix of daily and weekly series"""
+    rows = []
+    for pk in range(1, count + 1):
+        start = window_start - timedelta(days=30, hours=-9 - pk % 8)
+        weekly = pk % 3 == 0
+        rows.append((
+            pk, f'Meeting {pk}', 'Recurring team meeting', start, start + timedelta(hours=1), True,
+            'WEEKLY' if weekly else 'DAILY', 1, 'MO,WE,FR' if weekly else None, None, None, None, None,
+        ))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Time .ics exports rendered serially and in 1..N worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10000)
+        parser.add_argument('--window-days', type=int, default=31)
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        window_start = timezone.make_aware(datetime(2025, 6, 1))
+        window_end = window_start + timedelta(days=options['window_days'])
+        rows = event_rows(options['events'], window_start)
+        dtstamp = datetime.now()
+
+        started = time.perf_counter()
+        events = [Event(**dict(zip(EVENT_FIELDS, row))) for row in rows]
+        serial = b''.join(ical.occurrence_chunks(events, {}, window_start, window_end, dtstamp))
+        baseline = time.perf_counter() - started
+
+        self.stdout.write(f"{options['events']} events, {serial.count(b'BEGIN:VEVENT')} occurrences, "
+                          f"{len(serial) / 1024 / 1024:.1f} MB")
+        self.stdout.write(f"{'workers':>8}{'seconds':>10}{'speedup':>10}")
+        self.stdout.write(f"{'serial':>8}{baseline:>10.2f}{1:>10.2f}")
+
+        workers = 1
+        while workers <= options['max_workers']:
+            jobs = [
+                ('occurrences', chunk, [], window_start, window_end, dtstamp)
+                for chunk in iter_chunks(rows, options['chunk_size'])
+            ]
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                parallel = b''.join(map_in_order(pool, render_chunk, jobs, in_flight=workers * 2))
+            elapsed = time.perf_counter() - started
+            assert parallel == serial
+            self.stdout.write(f"{workers:>8}{elapsed:>10.2f}{baseline / elapsed:>10.2f}")
+            workers *= 2
@@ -0,0 +1,100 @@
+import timeit
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from eventapp.models import Event
+from eventapp.recurrence import WEEKDAY_MAP, RecurrenceRule, generate_occurrences, next_weekday
+
+
+def walk_occurrences(event, start, end):
+    """Step-by-step expansion from event.start, as generate_occurrences used to do.
+
+    Kept here only as a baseline for the benchmark.
+    """
+    occurrences = []
+    current = event.start
+    while current <= (event.until or end):
+        if current >= start:
+            occurrences.append(current)
+        if event.frequency == 'DAILY':
+            current += timedelta(days=event.interval)
+        elif event.frequency == 'WEEKLY':
+            if event.weekdays:
+                weekday_numbers = [WEEKDAY_MAP[wd] for wd in event.weekdays.split(',')]
+                current = min(next_weekday(current + timedelta(days=1), wd) for wd in weekday_numbers)
+            else:
+                current += timedelta(weeks=event.interval)
+        elif event.frequency == 'MONTHLY':
+            current += relativedelta(months=event.interval)
+        elif event.frequency == 'YEARLY':
+            current += relativedelta(years=event.interval)
+    return occurrences
+
+
+class Command(BaseCommand):
+    help = 'Compare step-by-step, closed-form and compiled recurrence expansion'
+
+    RULES = [
+        {'frequency': 'DAILY'},
+        {'frequency': 'WEEKLY', 'weekdays': 'MO,WE,FR'},
+        {'frequency': 'MONTHLY'},
+        {'frequency': 'YEARLY'},
+    ]
+    AGES = [30, 365, 5 * 365, 20 * 365]
+    WEEKDAY_SETS = ['MO,TH', 'MO,WE,FR', 'MO,TU,WE,TH,FR', 'MO,TU,WE,TH,FR,SA,SU']
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-days', type=int, default=7)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        window_start = timezone.make_aware(datetime(2025, 6, 2))
+        window_end = window_start + timedelta(days=options['window_days'])
+        repeat = options['repeat']
+
+        self.stdout.write(f"{'rule':<10}{'age (days)':>12}{'walk (ms)':>12}{'jump (ms)':>12}{'speedup':>10}")
+        for rule in self.RULES:
+            for age in self.AGES:
+                event_start = window_start - timedelta(days=age, hours=-9)
+                event = Event(
+                    start=event_start,
+                    end=event_start + timedelta(hours=1),
+                    is_recurring=True,
+                    interval=1,
+                    **rule,
+                )
+                walk = timeit.timeit(lambda: walk_occurrences(event, window_start, window_end), number=repeat)
+                jump = timeit.timeit(lambda: generate_occurrences(event, window_start, window_end), number=repeat)
+                self.stdout.write(
+                    f"{rule['frequency']:<10}{age:>12}"
+                    f"{walk / repeat * 1000:>12.3f}{jump / repeat * 1000:>12.3f}{walk / jump:>9.1f}x"
+                )
+
+        self.stdout.write('')
+        self.stdout.write(f"Weekly rules expanded over {options['window_days']} days (cold = compiled per call, warm = cached rule)")
+        self.stdout.write(f"{'weekdays':<24}{'walk (ms)':>12}{'cold (ms)':>12}{'warm (ms)':>12}{'compile (us)':>14}")
+        for pk, weekdays in enumerate(self.WEEKDAY_SETS, start=1):
+            event_start = window_start - timedelta(days=365, hours=-9)
+            fields = {
+                'start': event_start,
+                'end': event_start + timedelta(hours=1),
+                'is_recurring': True,
+                'frequency': 'WEEKLY',
+                'interval': 1,
+                'weekdays': weekdays,
+            }
+            unsaved = Event(**fields)
+            saved = Event(pk=pk, updated_at=event_start, **fields)
+            generate_occurrences(saved, window_start, window_end)  # prime the rule cache
+
+            walk = timeit.timeit(lambda: walk_occurrences(unsaved, window_start, window_end), number=repeat)
+            cold = timeit.timeit(lambda: generate_occurrences(unsaved, window_start, window_end), number=repeat)
+            warm = timeit.timeit(lambda: generate_occurrences(saved, window_start, window_end), number=repeat)
+            compile_time = timeit.timeit(lambda: RecurrenceRule(unsaved), number=repeat)
+            self.stdout.write(
+                f"{weekdays:<24}{walk / repeat * 1000:>12.3f}{cold / repeat * 1000:>12.3f}"
+                f"{warm / repeat * 1000:>12.3f}{compile_time / repeat * 1e6:>14.1f}"
+            )
@@ -0,0 +1,53 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from eventapp import overrides
+
+
+class Command(BaseCommand):
+    help = 'Remove orphaned, redundant and stale occurrence overrides (safe to run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Also remove overrides of occurrences older than this '
+                                 '(default: OVERRIDE_RETENTION_DAYS; 0 keeps them)')
+        parser.add_argument('--archive', default=None,
+                            help='Append removed rows to this file as JSON lines')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be removed without deleting')
+        parser.add_argument('--batch-size', type=int, default=overrides.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        retention_days = options['retention_days']
+        if retention_days is None:
+            retention_days = getattr(settings, 'OVERRIDE_RETENTION_DAYS', 0)
+        stale_before = timezone.now() - timedelta(days=retention_days) if retention_days else None
+
+        started = time.monotonic()
+        try:
+            archive = open(options['archive'], 'a') if options['archive'] else None
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            counts = overrides.compact_overrides(
+                stale_before=stale_before,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                archive=archive,
+            )
+        finally:
+            if archive is not None:
+                archive.close()
+        elapsed = time.monotonic() - started
+
+        removed = counts['orphaned'] + counts['redundant'] + counts['stale']
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {removed} of {counts['scanned']} overrides "
+            f"({counts['orphaned']} orphaned, {counts['redundant']} redundant, {counts['stale']} stale) "
+            f"in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,59 @@
+import sys
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from eventapp.models import Event, User
+from eventapp.parallel_export import CHUNK_SIZE, get_workers, stream_parallel
+
+
+class Command(BaseCommand):
+    help = 'Export events of one or all users to an .ics file using worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', help='ISO start of the export window')
+        parser.add_argument('end', help='ISO end of the export window')
+        parser.add_argument('--user', help='Only export this username (default: everyone)')
+        parser.add_argument('--mode', choices=['occurrences', 'series'], default='occurrences')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: EXPORT_PROCESSES or one per core)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            start, end = datetime.fromisoformat(options['start']), datetime.fromisoformat(options['end'])
+        except ValueError:
+            raise CommandError('start and end must be ISO 8601 timestamps')
+        start = timezone.make_aware(start) if timezone.is_naive(start) else start
+        end = timezone.make_aware(end) if timezone.is_naive(end) else end
+
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']}")
+            events = Event.objects.overlapping(user, start, end)
+        else:
+            events = Event.objects.active_between(start, end)
+
+        workers = options['workers'] or get_workers()
+        started = time.monotonic()
+        try:
+            output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        except OSError as e:
+            raise CommandError(str(e))
+        size = 0
+        try:
+            for chunk in stream_parallel(events, options['mode'], start, end, workers, options['chunk_size']):
+                output.write(chunk)
+                size += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {size / 1024:.0f} KB with {workers} workers in {time.monotonic() - started:.1f}s'
+        ))
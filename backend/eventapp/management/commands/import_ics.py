@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from eventapp.ics_import import IMPORT_BATCH_SIZE, import_ics
+from eventapp.models import User
+
+
+class Command(BaseCommand):
+    help = "Import an .ics file into a user's calendar"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path', help='.ics file to import')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_ics(user, stream, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['events']} events and {result['overrides']} overrides "
+            f"({result['skipped']} skipped) in {result['seconds']:.1f}s, "
+            f"{result['eventsPerSecond']} events/s"
+        ))
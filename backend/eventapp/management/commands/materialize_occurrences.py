@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from eventapp import materialization
+
+
+class Command(BaseCommand):
+    help = 'Extend the materialized Occurrence window (run daily to keep it rolling)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Days ahead of today to cover (default: OCCURRENCE_HORIZON_DAYS)')
+        parser.add_argument('--history-days', type=int, default=None,
+                            help='Days before today to keep (default: OCCURRENCE_HISTORY_DAYS)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Drop and re-expand every event instead of extending')
+        parser.add_argument('--batch-size', type=int, default=materialization.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not materialization.is_enabled():
+            raise CommandError('OCCURRENCE_MATERIALIZATION is disabled')
+
+        started = time.monotonic()
+        created, deleted = materialization.extend_horizon(
+            days=options['days'],
+            history_days=options['history_days'],
+            rebuild=options['rebuild'],
+            batch_size=options['batch_size'],
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} occurrences, deleted {deleted} in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from eventapp import upcoming
+
+
+class Command(BaseCommand):
+    help = 'Move Event.next_occurrence_at past occurrences that have started (run every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute every event, e.g. to backfill after migrating')
+        parser.add_argument('--batch-size', type=int, default=upcoming.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        changed = upcoming.roll_next_occurrences(everything=options['all'], batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'Updated {changed} events in {elapsed:.1f}s'))
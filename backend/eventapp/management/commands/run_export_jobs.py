@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from eventapp import export_jobs
+from eventapp.models import ExportJob
+
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Run queued background .ics exports (keep one or more running, or use --once from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to wait between polls of an empty queue')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes rendering each export (0: EXPORT_PROCESSES)')
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Delete finished exports older than this '
+                                 '(default: EXPORT_JOB_RETENTION_DAYS; 0 keeps them)')
+
+    def handle(self, *args, **options):
+        retention_days = options['retention_days']
+        if retention_days is None:
+            retention_days = getattr(settings, 'EXPORT_JOB_RETENTION_DAYS', 7)
+        workers = options['workers'] or None
+        last_purge = None
+
+        while True:
+            if retention_days and (last_purge is None or time.monotonic() - last_purge > PURGE_INTERVAL):
+                purged = export_jobs.purge_jobs(timezone.now() - timedelta(days=retention_days))
+                if purged:
+                    self.stdout.write(f'Purged {purged} old exports')
+                last_purge = time.monotonic()
+
+            job = export_jobs.claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            started = time.monotonic()
+            finished = export_jobs.run_job(job, workers)
+            elapsed = time.monotonic() - started
+            if finished is None:
+                self.stderr.write(self.style.WARNING(f'Export {job.pk} for {job.user_id} was taken over by another worker'))
+            elif job.status == ExportJob.DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Export {job.pk} for {job.user_id}: {job.size / 1024:.0f} KB in {elapsed:.1f}s'
+                ))
+            else:
+                self.stderr.write(self.style.ERROR(f'Export {job.pk} for {job.user_id} failed: {job.error}'))
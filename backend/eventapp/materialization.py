@@ -0,0 +1,125 @@
+"""Pre-expanded occurrence storage.
+
+When settings.OCCURRENCE_MATERIALIZATION is on, every event's occurrences
+inside the OccurrenceHorizon window are stored in the Occurrence table with
+overrides already applied, so the calendar can be answered with a single
+indexed range query. Rows for one event are rebuilt whenever that event or
+one of its overrides changes (see eventapp.signals); the
+`materialize_occurrences` management command rolls the window forward.
+"""
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Event, Occurrence, OccurrenceHorizon, OccurrenceOverride
+from .recurrence import iter_occurrences, resolve_occurrence
+
+BATCH_SIZE = 1000
+
+
+def is_enabled():
+    return getattr(settings, 'OCCURRENCE_MATERIALIZATION', False)
+
+
+def get_horizon():
+    """Return the materialized window, or None when materialization is off"""
+    if not is_enabled():
+        return None
+    return OccurrenceHorizon.current()
+
+
+def build_occurrences(event, start, end, overrides):
+    """Yield unsaved Occurrence rows for event in [start, end].
+
+    `overrides` maps (event_id, original_start) to OccurrenceOverride.
+    """
+    for occ in iter_occurrences(event, start, end):
+        resolved = resolve_occurrence(event, occ, overrides.get((event.id, occ)))
+        if resolved is None:
+            continue
+        yield Occurrence(
+            user_id=event.user_id,
+            event_id=event.id,
+            original_start=occ,
+            start=resolved[0],
+            end=resolved[1],
+        )
+
+
+def _override_index(start, end, **filters):
+    overrides = OccurrenceOverride.objects.filter(
+        original_start__gte=start,
+        original_start__lte=end,
+        **filters,
+    )
+    return {(o.event_id, o.original_start): o for o in overrides}
+
+
+def rebuild_event(event_id):
+    """Rebuild the Occurrence rows of a single event within the horizon"""
+    return rebuild_events([event_id])
+
+
+def rebuild_events(event_ids):
+    """Rebuild the Occurrence rows of several events; ids of deleted events are fine"""
+    horizon = get_horizon()
+    if horizon is None:
+        return 0
+
+    with transaction.atomic():
+        Occurrence.objects.filter(event_id__in=event_ids).delete()
+        events = Event.objects.filter(pk__in=event_ids)
+        overrides = _override_index(horizon.start, horizon.end, event_id__in=event_ids)
+        rows = Occurrence.objects.bulk_create(
+            chain.from_iterable(
+                build_occurrences(event, horizon.start, horizon.end, overrides) for event in events
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    return len(rows)
+
+
+def extend_horizon(days=None, history_days=None, rebuild=False, batch_size=BATCH_SIZE):
+    """Roll the materialized window to [now - history_days, now + days].
+
+    Only the slice past the previous window end is expanded; rows that fall
+    before the new window start are dropped. A full rebuild happens when
+    there is no previous window, when it would grow backwards, or on request.
+    Returns (rows_created, rows_deleted).
+    """
+    if days is None:
+        days = getattr(settings, 'OCCURRENCE_HORIZON_DAYS', 548)
+    if history_days is None:
+        history_days = getattr(settings, 'OCCURRENCE_HISTORY_DAYS', 92)
+
+    now = timezone.now()
+    new_start = now - timedelta(days=history_days)
+    new_end = now + timedelta(days=days)
+    horizon = OccurrenceHorizon.current()
+
+    if horizon is None or rebuild or new_start < horizon.start:
+        expand_from, deleted_filter = new_start, {}
+    else:
+        expand_from, deleted_filter = horizon.end, {'original_start__lt': new_start}
+
+    created = 0
+    with transaction.atomic():
+        deleted, _ = Occurrence.objects.filter(**deleted_filter).delete()
+        overrides = _override_index(expand_from, new_end)
+        events = Event.objects.filter(start__lte=new_end).order_by('pk')
+        batch = []
+        for event in events.iterator(chunk_size=batch_size):
+            for row in build_occurrences(event, expand_from, new_end, overrides):
+                # The previous window already holds rows up to its end
+                if deleted_filter and row.original_start <= expand_from:
+                    continue
+                batch.append(row)
+            if len(batch) >= batch_size:
+                created += len(Occurrence.objects.bulk_create(batch, batch_size=batch_size))
+                batch = []
+        created += len(Occurrence.objects.bulk_create(batch, batch_size=batch_size))
+        OccurrenceHorizon.objects.update_or_create(pk=1, defaults={'start': new_start, 'end': new_end})
+    return created, deleted
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:09
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def delete_duplicate_overrides(apps, schema_editor):
+    """Keep only the newest override per (event, original_start)"""
+    OccurrenceOverride = apps.get_model('eventapp', 'OccurrenceOverride')
+    duplicates = (
+        OccurrenceOverride.objects
+        .values('event', 'original_start')
+        .annotate(count=Count('id'), keep=Max('id'))
+        .filter(count__gt=1)
+    )
+    for dup in duplicates:
+        OccurrenceOverride.objects.filter(
+            event=dup['event'],
+            original_start=dup['original_start'],
+        ).exclude(id=dup['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventapp', '0003_occurrencehorizon_occurrence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user', 'start'], name='event_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user', 'is_recurring', 'until'], name='event_user_recurring_until_idx'),
+        ),
+        migrations.RunPython(delete_duplicate_overrides, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='occurrenceoverride',
+            constraint=models.UniqueConstraint(fields=('event', 'original_start'), name='unique_override_per_occurrence'),
+        ),
+    ]
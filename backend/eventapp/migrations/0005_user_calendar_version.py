@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventapp', '0004_calendar_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='calendar_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
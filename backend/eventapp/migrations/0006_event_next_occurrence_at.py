@@ -0,0 +1,22 @@
+# Generated by Django 5.0.6 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('eventapp', '0005_user_calendar_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='next_occurrence_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['user', 'next_occurrence_at'], name='event_user_next_occurrence_idx'),
+        ),
+    ]
@@ -19,6 +19,10 @@ class User(AbstractUser):
         blank=True
     )
 
+    # Bumped on every change to the user's events or overrides; used to
+    # validate cached calendar responses (see eventapp.versioning)
+    calendar_version = models.PositiveIntegerField(default=0, editable=False)
+
     def save(self, *args, **kwargs):
         if not self.id:
             # Generate custom ID
@@ -35,6 +39,31 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+class EventQuerySet(models.QuerySet):
+    # Columns needed to expand and display occurrences
+    EXPANSION_FIELDS = (
+        'id', 'user_id', 'title', 'description', 'start', 'end', 'is_recurring',
+        'frequency', 'interval', 'weekdays', 'month_day', 'month_week',
+        'month_weekday', 'until', 'updated_at',
+    )
+
+    def overlapping(self, user, start, end):
+        """A user's events that can have occurrences between start and end.
+
+        Series that begin after the window or ended before it are pruned in
+        SQL, as are one-off events that finished before the window.
+        """
+        return self.filter(user=user).active_between(start, end)
+
+    def active_between(self, start, end):
+        """Like overlapping(), for events of any user (filter them separately)"""
+        return self.filter(
+            models.Q(is_recurring=True, until__isnull=True)
+            | models.Q(is_recurring=True, until__gte=start)
+            | models.Q(is_recurring=False, end__gte=start),
+            start__lte=end,
+        ).only(*self.EXPANSION_FIELDS)
+
 class Event(models.Model):
     FREQUENCY_CHOICES = [
         ('DAILY', 'Daily'),
@@ -68,6 +97,22 @@ class Event(models.Model):
     until = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Start of the next occurrence that is not cancelled, None once the
+    # series is over; maintained by eventapp.upcoming
+    next_occurrence_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Calendar reads: a user's events starting before the window end
+            models.Index(fields=['user', 'start'], name='event_user_start_idx'),
+            # Recurring series still active in a window
+            models.Index(fields=['user', 'is_recurring', 'until'], name='event_user_recurring_until_idx'),
+            # Upcoming events: a user's events ordered by their next occurrence
+            models.Index(fields=['user', 'next_occurrence_at'], name='event_user_next_occurrence_idx'),
+        ]
+
     def clean(self):
         super().clean()  
         if self.is_recurring:
@@ -92,5 +137,88 @@ class OccurrenceOverride(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'original_start'], name='unique_override_per_occurrence'),
+        ]
+
+    def __str__(self):
+        return f"Override for {self.original_start}"
+
+class Occurrence(models.Model):
+    """Pre-expanded occurrence of an Event, with overrides applied.
+
+    Only populated when OCCURRENCE_MATERIALIZATION is enabled; see
+    eventapp.materialization.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='occurrences')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='occurrences')
+    original_start = models.DateTimeField()
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'original_start'], name='occurrence_user_orig_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"Occurrence of {self.event_id} at {self.start}"
+
+class OccurrenceHorizon(models.Model):
+    """The window the Occurrence table currently covers (a single row)"""
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).first()
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def __str__(self):
+        return f"Occurrences materialized from {self.start} to {self.end}"
+
+class ExportJob(models.Model):
+    """An .ics export generated in the background; see eventapp.export_jobs"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    MODE_CHOICES = [
+        ('occurrences', 'One VEVENT per occurrence'),
+        ('series', 'One VEVENT per series'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    mode = models.CharField(max_length=11, choices=MODE_CHOICES, default='occurrences')
+    # The user's calendar_version the export was requested at; a finished
+    # job is reused while the version is unchanged
+    calendar_version = models.PositiveIntegerField()
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=PENDING)
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's queue: oldest pending job first
+            models.Index(fields=['status', 'created_at'], name='exportjob_status_created_idx'),
+            # Reuse lookups for an unchanged calendar
+            models.Index(fields=['user', 'calendar_version'], name='exportjob_user_version_idx'),
+        ]
+
     def __str__(self):
-        return f"Override for {self.original_start}"
\ No newline at end of file
+        return f"Export {self.pk} of {self.user_id} ({self.status})"
@@ -0,0 +1,151 @@
+"""Batch writes and garbage collection of OccurrenceOverride rows.
+
+Overrides are upserted with a single INSERT ... ON CONFLICT (event,
+original_start) DO UPDATE, so repeating a request never creates duplicate
+rows. bulk_create skips model signals; the calendar version is bumped and
+the event's materialized occurrences rebuilt here instead.
+
+compact_overrides() removes rows that no longer affect any calendar. It is
+meant to run periodically (see the `compact_overrides` management command).
+"""
+import json
+
+from django.db import transaction
+
+from .models import Event, EventQuerySet, OccurrenceOverride
+from .recurrence import iter_occurrences, resolve_occurrence
+from .signals import calendar_signals_deferred, refresh_events
+from .versioning import bump_calendar_version
+
+UPSERT_FIELDS = ['new_start', 'new_end', 'is_cancelled', 'updated_at']
+
+BATCH_SIZE = 1000
+
+
+def upsert_overrides(event, overrides):
+    """Insert or replace overrides of one event by original_start"""
+    # A row may only be touched once per statement
+    unique = list({override.original_start: override for override in overrides}.values())
+    OccurrenceOverride.objects.bulk_create(
+        unique,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['event', 'original_start'],
+        update_fields=UPSERT_FIELDS,
+    )
+    if unique:
+        bump_calendar_version(event.user_id)
+        refresh_events([event])
+    return len(unique)
+
+
+def cancel_occurrences(event, original_starts):
+    return upsert_overrides(event, [
+        OccurrenceOverride(event=event, original_start=occ, is_cancelled=True) for occ in original_starts
+    ])
+
+
+def shift_occurrences(event, original_starts, delta):
+    """Move occurrences by delta from where they currently are; cancelled ones stay cancelled"""
+    original_starts = list(original_starts)
+    existing = {o.original_start: o for o in event.overrides.filter(original_start__in=original_starts)}
+    rows = []
+    for occ in original_starts:
+        resolved = resolve_occurrence(event, occ, existing.get(occ))
+        if resolved is None:
+            continue
+        start, end = resolved
+        rows.append(OccurrenceOverride(event=event, original_start=occ, new_start=start + delta, new_end=end + delta))
+    return upsert_overrides(event, rows)
+
+
+def is_occurrence(event, occ):
+    """Whether occ is the original start of one of event's occurrences"""
+    return next(iter_occurrences(event, occ, occ), None) == occ
+
+
+def classify_override(event, override, stale_before=None):
+    """Why an override can be removed, or None if it still matters.
+
+    orphaned: original_start is not an occurrence of the event any more,
+    e.g. past its until or after the rule was edited.
+    redundant: neither cancels nor moves its occurrence.
+    stale: its occurrence lies before stale_before.
+    """
+    occ = override.original_start
+    if not is_occurrence(event, occ):
+        return 'orphaned'
+    if resolve_occurrence(event, occ, override) == resolve_occurrence(event, occ):
+        return 'redundant'
+    if stale_before is not None and occ < stale_before:
+        return 'stale'
+    return None
+
+
+def _archive_row(override, reason):
+    return json.dumps({
+        'id': override.id,
+        'event': override.event_id,
+        'original_start': override.original_start.isoformat(),
+        'new_start': override.new_start.isoformat() if override.new_start else None,
+        'new_end': override.new_end.isoformat() if override.new_end else None,
+        'is_cancelled': override.is_cancelled,
+        'reason': reason,
+    })
+
+
+def compact_overrides(stale_before=None, batch_size=BATCH_SIZE, dry_run=False, archive=None):
+    """Delete overrides that are orphaned, redundant or (optionally) stale.
+
+    Events with overrides are scanned batch_size at a time, each batch with
+    one query for its overrides and one DELETE. `archive` is an optional
+    text file that receives every removed row as a JSON line once its batch
+    is deleted; nothing is archived on a dry run. Orphaned and
+    redundant rows never change a calendar; removing stale ones does, so the
+    owners' calendar versions are bumped for those. Returns counts per reason.
+    """
+    counts = {'scanned': 0, 'orphaned': 0, 'redundant': 0, 'stale': 0}
+    events = (
+        Event.objects
+        .filter(pk__in=OccurrenceOverride.objects.values('event_id'))
+        .only(*EventQuerySet.EXPANSION_FIELDS)
+        .order_by('pk')
+    )
+    batch = []
+    for event in events.iterator(chunk_size=batch_size):
+        batch.append(event)
+        if len(batch) == batch_size:
+            _compact_batch(batch, stale_before, dry_run, archive, counts)
+            batch = []
+    _compact_batch(batch, stale_before, dry_run, archive, counts)
+    return counts
+
+
+def _compact_batch(events, stale_before, dry_run, archive, counts):
+    if not events:
+        return
+    by_id = {event.pk: event for event in events}
+    garbage, stale_events, archived = [], set(), []
+    for override in OccurrenceOverride.objects.filter(event_id__in=by_id):
+        counts['scanned'] += 1
+        event = by_id[override.event_id]
+        reason = classify_override(event, override, stale_before)
+        if reason is None:
+            continue
+        counts[reason] += 1
+        garbage.append(override.pk)
+        if reason == 'stale':
+            stale_events.add(event)
+        if archive is not None:
+            archived.append(_archive_row(override, reason) + '\n')
+
+    if dry_run or not garbage:
+        return
+    with transaction.atomic(), calendar_signals_deferred():
+        OccurrenceOverride.objects.filter(pk__in=garbage).delete()
+        for user_id in {event.user_id for event in stale_events}:
+            bump_calendar_version(user_id)
+        refresh_events([event.pk for event in stale_events])
+    # Only rows that are really gone are archived
+    if archive is not None:
+        archive.writelines(archived)
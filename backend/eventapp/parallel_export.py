@@ -0,0 +1,104 @@
+""".ics exports rendered in parallel worker processes.
+
+Expanding and serializing tens of thousands of events is CPU-bound, so a
+single thread (or a thread pool, under the GIL) cannot go faster than one
+core. Here events are read as plain tuples, split into chunks in export
+order, and each chunk is expanded and serialized to ICS bytes by a
+ProcessPoolExecutor worker. Only tuples cross the process boundary; workers
+rebuild unsaved Event/OccurrenceOverride instances, which never touch the
+database. The parent yields the chunks in order as they complete, keeping a
+bounded number in flight so memory does not grow with the export.
+"""
+import os
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+
+from . import ical
+from .models import Event, OccurrenceOverride
+
+EVENT_FIELDS = (
+    'id', 'title', 'description', 'start', 'end', 'is_recurring', 'frequency',
+    'interval', 'weekdays', 'month_day', 'month_week', 'month_weekday', 'until',
+)
+OVERRIDE_FIELDS = ('event_id', 'original_start', 'new_start', 'new_end', 'is_cancelled')
+
+# Events per worker task
+CHUNK_SIZE = 500
+
+
+def get_workers():
+    """EXPORT_PROCESSES, or one process per core when it is 0"""
+    return getattr(settings, 'EXPORT_PROCESSES', 0) or os.cpu_count() or 1
+
+
+def init_worker():
+    # Forked workers inherit the parent's app registry; spawned ones load it
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def render_chunk(mode, event_rows, override_rows, start, end, dtstamp):
+    """Serialize a chunk of events given as tuples of EVENT_FIELDS/OVERRIDE_FIELDS.
+
+    Runs in a worker process; returns the chunk's VEVENTs as ICS bytes.
+    """
+    events = [Event(**dict(zip(EVENT_FIELDS, row))) for row in event_rows]
+    overrides = [OccurrenceOverride(**dict(zip(OVERRIDE_FIELDS, row))) for row in override_rows]
+    if mode == 'series':
+        by_event = defaultdict(list)
+        for override in overrides:
+            by_event[override.event_id].append(override)
+        return b''.join(ical.series_chunks(events, by_event, dtstamp))
+    index = {(override.event_id, override.original_start): override for override in overrides}
+    return b''.join(ical.occurrence_chunks(events, index, start, end, dtstamp))
+
+
+def iter_chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def map_in_order(pool, func, jobs, in_flight):
+    """Yield func(*job) for each job, in order, with at most in_flight jobs submitted ahead"""
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(func, *job))
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def stream_parallel(events, mode, start, end, workers=None, chunk_size=None):
+    """Yield an .ics file for an Event queryset, rendered by a pool of processes.
+
+    `mode` is 'occurrences' (one VEVENT per occurrence in [start, end]) or
+    'series' (one master VEVENT per event), as in ExportCalendarView.
+    """
+    workers = workers or get_workers()
+    chunk_size = chunk_size or CHUNK_SIZE
+
+    def chunk_overrides(chunk):
+        # Loaded as each chunk is submitted, so only chunks in flight hold overrides
+        overrides = OccurrenceOverride.objects.filter(event__in=[row[0] for row in chunk])
+        if mode == 'occurrences':
+            overrides = overrides.filter(original_start__gte=start, original_start__lte=end)
+        return list(overrides.values_list(*OVERRIDE_FIELDS))
+
+    rows = events.order_by('pk').values_list(*EVENT_FIELDS).iterator(chunk_size=ical.EXPORT_CHUNK_SIZE)
+    dtstamp = datetime.now()
+    jobs = (
+        (mode, chunk, chunk_overrides(chunk), start, end, dtstamp)
+        for chunk in iter_chunks(rows, chunk_size)
+    )
+    yield ical.calendar_header()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        yield from map_in_order(pool, render_chunk, jobs, in_flight=workers * 2)
+    yield ical.CALENDAR_FOOTER
@@ -0,0 +1,123 @@
+"""Compact calendar payloads and their fast JSON rendering.
+
+Occurrences of a window are kept grouped by event: each group is
+(event metadata, [(start, end, originalStart), ...]) with timestamps already
+formatted. Event fields are therefore stored and serialized once per event
+instead of once per occurrence, and the JSON is assembled from pre-escaped
+fragments rather than through a dict per occurrence.
+
+Two response shapes are rendered from the same groups:
+
+* ``flat`` (default) -- the historical list of occurrence objects
+* ``grouped`` -- one object per event with an ``occurrences`` array of
+  ``[start, end, originalStart]`` triples
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+
+SHAPES = ('flat', 'grouped')
+
+
+class TimestampFormatter:
+    """isoformat() memoized per datetime.
+
+    Most occurrences share their start with originalStart, and events at the
+    same time of day share timestamps, so each distinct instant is formatted
+    once per build.
+    """
+
+    __slots__ = ('_memo',)
+
+    def __init__(self):
+        self._memo = {}
+
+    def __call__(self, dt):
+        text = self._memo.get(dt)
+        if text is None:
+            text = self._memo[dt] = dt.isoformat()
+        return text
+
+
+class WindowGroups:
+    """Collects occurrences for one window, grouped by event in arrival order"""
+
+    __slots__ = ('groups',)
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, event_id, meta, row):
+        """Append row to the event's group; `meta` is a callable building its fields"""
+        group = self.groups.get(event_id)
+        if group is None:
+            group = self.groups[event_id] = (meta(), [])
+        group[1].append(row)
+
+    def freeze(self):
+        return [(meta, tuple(rows)) for meta, rows in self.groups.values()]
+
+
+def event_meta(event):
+    return {
+        'id': event.id,
+        'title': event.title,
+        'description': event.description,
+        'isRecurring': event.is_recurring,
+    }
+
+
+def _json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _flat_json(groups):
+    parts = []
+    for meta, rows in groups:
+        prefix = _json(meta)[:-1] + ',"start":"'
+        for start, end, original in rows:
+            parts.append(f'{prefix}{start}","end":"{end}","originalStart":"{original}"}}')
+    return '[' + ','.join(parts) + ']'
+
+
+def _grouped_json(groups):
+    parts = []
+    for meta, rows in groups:
+        occurrences = ','.join(f'["{start}","{end}","{original}"]' for start, end, original in rows)
+        parts.append(_json(meta)[:-1] + f',"occurrences":[{occurrences}]}}')
+    return '[' + ','.join(parts) + ']'
+
+
+class CalendarPayload:
+    """A window's occurrence groups, rendered in the requested shape"""
+
+    def __init__(self, groups, shape='flat'):
+        self.groups = groups
+        self.shape = shape
+
+    def to_json(self):
+        return _grouped_json(self.groups) if self.shape == 'grouped' else _flat_json(self.groups)
+
+
+class WindowsPayload:
+    """Several windows' payloads, as returned for multi-window requests"""
+
+    def __init__(self, windows, payloads):
+        self.windows = windows
+        self.payloads = payloads
+
+    def to_json(self):
+        parts = [
+            f'{{"start":"{start.isoformat()}","end":"{end.isoformat()}","events":{payload.to_json()}}}'
+            for (start, end), payload in zip(self.windows, self.payloads)
+        ]
+        return '[' + ','.join(parts) + ']'
+
+
+class CalendarJSONRenderer(JSONRenderer):
+    """JSONRenderer with a fast path for calendar payloads"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (CalendarPayload, WindowsPayload)):
+            return data.to_json().encode()
+        return super().render(data, accepted_media_type, renderer_context)
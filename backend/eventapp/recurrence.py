@@ -1,7 +1,12 @@
-from datetime import datetime, timedelta
+import calendar
+import heapq
+from collections import OrderedDict
+from datetime import MAXYEAR, datetime, timedelta
+from itertools import islice
+from threading import Lock
 from dateutil.relativedelta import relativedelta
 from django.utils import timezone
-from .models import Event
+from .models import Event, OccurrenceOverride
 
 WEEKDAY_MAP = {
     'MO': 0,
@@ -37,79 +42,258 @@ def nth_weekday_in_month(year, month, nth, weekday):
 
     return first_target + timedelta(weeks=nth - 1)
 
-def generate_occurrences(event, start, end):
-    """Generate event occurrences between start and end dates"""
-    occurrences = []
-    current = event.start
-    
-    # Handle single occurrence
-    if not event.is_recurring:
-        if start <= current <= end:
-            return [current]
-        return []
-    
-    # Handle recurrence patterns
-    while current <= (event.until or end):
-        if current >= start:
-            occurrences.append(current)
-        
-        if event.frequency == 'DAILY':
-            current += timedelta(days=event.interval)
-        elif event.frequency == 'WEEKLY':
-            if event.weekdays:
-                # Convert weekday codes to numbers
-                weekday_numbers = [WEEKDAY_MAP[wd] for wd in event.weekdays.split(',')]
-                
-                # Find the next occurrence for each weekday
-                next_dates = [
-                    next_weekday(current + timedelta(days=1), wd) 
-                    for wd in weekday_numbers
-                ]
-                
-                # Get the earliest next date
-                next_date = min(next_dates)
-                current = next_date
+RULE_CACHE_SIZE = 4096
+
+_rule_cache = OrderedDict()
+_rule_cache_lock = Lock()
+
+class RecurrenceRule:
+    """An Event's recurrence pattern compiled for repeated expansion.
+
+    Everything that depends only on the event's fields (weekday set, period
+    length, month arithmetic base) is computed once here. A rule is split
+    into periods -- one step of `interval` days, weeks, months or years from
+    the anchor (event.start) -- and `step(period)` returns the occurrences a
+    period produces, in order, or None once the rule has no periods left.
+    """
+
+    __slots__ = (
+        'anchor', 'until', 'is_recurring', 'frequency', 'interval',
+        'weekday_mask', 'weekday_offsets', 'month_day', 'month_week',
+        'month_weekday', 'period_delta', 'week_start', 'anchor_month',
+        'step', 'first_period',
+    )
+
+    def __init__(self, event):
+        self.anchor = event.start
+        self.until = event.until
+        self.is_recurring = event.is_recurring
+        self.frequency = event.frequency
+        self.interval = event.interval
+        self.month_day = event.month_day
+        self.month_week = event.month_week
+        self.month_weekday = event.month_weekday
+
+        self.weekday_mask = 0
+        if event.weekdays:
+            for wd in event.weekdays.split(','):
+                self.weekday_mask |= 1 << WEEKDAY_MAP[wd]
+        self.weekday_offsets = tuple(
+            timedelta(days=wd) for wd in range(7) if self.weekday_mask >> wd & 1
+        )
+        self.week_start = self.anchor - timedelta(days=self.anchor.weekday())
+        self.anchor_month = self.anchor.year * 12 + self.anchor.month - 1
+        self.period_delta = None
+
+        if self.frequency == 'DAILY':
+            self.period_delta = timedelta(days=self.interval)
+            self.step, self.first_period = self._step_fixed, self._first_fixed
+        elif self.frequency == 'WEEKLY':
+            self.period_delta = timedelta(weeks=self.interval)
+            if self.weekday_mask:
+                self.step, self.first_period = self._step_weekdays, self._first_weekdays
             else:
-                current += timedelta(weeks=event.interval)
-        elif event.frequency == 'MONTHLY':
-            if event.month_day:
-                # Absolute day pattern (e.g., 15th of month)
-                try:
-                    next_month = current.month + event.interval
-                    next_year = current.year
-                    if next_month > 12:
-                        next_month -= 12
-                        next_year += 1
-                    
-                    current = datetime(
-                        next_year, 
-                        next_month, 
-                        min(event.month_day, 28),  # Safe day for all months
-                        current.hour,
-                        current.minute,
-                        tzinfo=timezone.utc
-                    )
-                except ValueError:  # Handle invalid dates
-                    current += relativedelta(months=event.interval)
-            elif event.month_week is not None and event.month_weekday is not None:
-                # Relative pattern (e.g., 2nd Friday)
-                next_month = current.month + event.interval
-                next_year = current.year
-                if next_month > 12:
-                    next_month -= 12
-                    next_year += 1
-                
-                current = nth_weekday_in_month(
-                    next_year,
-                    next_month,
-                    event.month_week,
-                    event.month_weekday
-                )
-                if not current:
-                    current += relativedelta(months=event.interval)
+                self.step, self.first_period = self._step_fixed, self._first_fixed
+        elif self.frequency == 'MONTHLY':
+            if self.month_day:
+                self.step = self._step_month_day
+            elif self.month_week is not None and self.month_weekday is not None:
+                self.step = self._step_month_weekday
             else:
-                current += relativedelta(months=event.interval)
-        elif event.frequency == 'YEARLY':
-            current += relativedelta(years=event.interval)
-    
-    return occurrences
\ No newline at end of file
+                self.step = self._step_months
+            self.first_period = self._first_monthly
+        elif self.frequency == 'YEARLY':
+            self.step, self.first_period = self._step_years, self._first_yearly
+        else:
+            self.step, self.first_period = self._step_none, self._first_none
+
+    def _first_fixed(self, start):
+        return -((self.anchor - start) // self.period_delta)
+
+    def _step_fixed(self, period):
+        return (self.anchor + period * self.period_delta,)
+
+    def _first_weekdays(self, start):
+        return (start - self.week_start) // self.period_delta
+
+    def _step_weekdays(self, period):
+        base = self.week_start + period * self.period_delta
+        return [base + offset for offset in self.weekday_offsets]
+
+    def _first_monthly(self, start):
+        months = start.year * 12 + start.month - 1 - self.anchor_month
+        return max(0, months // self.interval)
+
+    def _month(self, period):
+        year, month = divmod(self.anchor_month + period * self.interval, 12)
+        return year, month + 1
+
+    def _step_month_day(self, period):
+        if period == 0:
+            return (self.anchor,)
+        year, month = self._month(period)
+        # Clamp to the end of shorter months (e.g. the 31st in April)
+        day = min(self.month_day, calendar.monthrange(year, month)[1])
+        return (self.anchor.replace(year=year, month=month, day=day),)
+
+    def _step_month_weekday(self, period):
+        if period == 0:
+            return (self.anchor,)
+        year, month = self._month(period)
+        if year > MAXYEAR:
+            # Only reached by a pattern that no later month can match
+            return None
+        first_weekday, length = calendar.monthrange(year, month)
+        if self.month_week < 0:
+            last_weekday = (first_weekday + length - 1) % 7
+            day = length - (last_weekday - self.month_weekday) % 7 + (self.month_week + 1) * 7
+        else:
+            day = 1 + (self.month_weekday - first_weekday) % 7 + (self.month_week - 1) * 7
+        if not 1 <= day <= length:
+            # As in RFC 5545, a month without a 5th weekday has no occurrence
+            return ()
+        return (self.anchor.replace(year=year, month=month, day=day),)
+
+    def _step_months(self, period):
+        return (self.anchor + relativedelta(months=period * self.interval),)
+
+    def _first_yearly(self, start):
+        return max(0, (start.year - self.anchor.year) // self.interval)
+
+    def _step_years(self, period):
+        return (self.anchor + relativedelta(years=period * self.interval),)
+
+    def _first_none(self, start):
+        return 0
+
+    def _step_none(self, period):
+        return None
+
+    def between(self, start, stop):
+        """Yield occurrences in [start, stop]; stop may be None for an open-ended rule"""
+        current = self.anchor
+
+        # Handle single occurrence
+        if not self.is_recurring:
+            if start <= current and (stop is None or current <= stop):
+                yield current
+            return
+
+        # The series always starts at event.start, even when it does not match
+        # the rule (e.g. a weekly event created on a day not in weekdays)
+        if start <= current and (stop is None or current <= stop):
+            yield current
+
+        step = self.step
+        period = self.first_period(start) if start > current else 0
+        while True:
+            candidates = step(period)
+            if candidates is None:
+                return
+            for occ in candidates:
+                if stop is not None and occ > stop:
+                    return
+                if occ >= start and occ > current:
+                    yield occ
+            period += 1
+
+def compile_rule(event):
+    """Return the RecurrenceRule for an event, reusing it across requests.
+
+    Rules are cached in a bounded LRU keyed by (event.id, event.updated_at),
+    so any save of the event yields a fresh rule. Unsaved events are compiled
+    without caching.
+    """
+    if event.pk is None or event.updated_at is None:
+        return RecurrenceRule(event)
+
+    key = (event.pk, event.updated_at)
+    with _rule_cache_lock:
+        rule = _rule_cache.get(key)
+        if rule is not None:
+            _rule_cache.move_to_end(key)
+            return rule
+
+    rule = RecurrenceRule(event)
+    with _rule_cache_lock:
+        _rule_cache[key] = rule
+        if len(_rule_cache) > RULE_CACHE_SIZE:
+            _rule_cache.popitem(last=False)
+    return rule
+
+def iter_occurrences(event, start, end=None, limit=None):
+    """Lazily yield event occurrences between start and end dates.
+
+    Occurrences are produced in order and only on demand, so callers can stop
+    early. `end` may be None for "from start onwards", in which case the
+    series' own `until` (or `limit`) bounds the iteration. `limit` caps the
+    number of occurrences yielded, e.g. the next N for an agenda view.
+    """
+    rule = compile_rule(event)
+    if rule.is_recurring and rule.until:
+        stop = min(rule.until, end) if end else rule.until
+    else:
+        stop = end
+    return islice(rule.between(start, stop), limit)
+
+def generate_occurrences(event, start, end):
+    """Generate event occurrences between start and end dates"""
+    return list(iter_occurrences(event, start, end))
+
+def merge_occurrences(events, start, end=None):
+    """Lazily merge the occurrences of many events into one ordered stream.
+
+    Yields (occurrence_start, event) ordered by (occurrence_start, event.id)
+    using a k-way heap merge of each event's iter_occurrences, so consumers
+    that stop early only pay for what they read.
+    """
+    def tagged(event):
+        for occ in iter_occurrences(event, start, end):
+            yield occ, event.id, event
+
+    streams = [tagged(event) for event in events]
+    for occ, _, event in heapq.merge(*streams, key=lambda item: item[:2]):
+        yield occ, event
+
+def resolve_occurrence(event, occ, override=None):
+    """Apply an override to an occurrence.
+
+    Returns the (start, end) to display, or None when the occurrence is
+    cancelled. Occurrences keep the duration of the series' first instance.
+    """
+    if override and override.is_cancelled:
+        return None
+    start = override.new_start if override and override.new_start else occ
+    end = override.new_end if override and override.new_end else start + (event.end - event.start)
+    return start, end
+
+def next_occurrence(event, after, overrides=None):
+    """Start of the first occurrence at or after `after` that is not cancelled.
+
+    `overrides` maps original_start to the event's OccurrenceOverride rows.
+    Returns None when the series has no such occurrence left.
+    """
+    overrides = overrides or {}
+    for occ in iter_occurrences(event, after):
+        resolved = resolve_occurrence(event, occ, overrides.get(occ))
+        if resolved is not None:
+            return resolved[0]
+    return None
+
+def get_override_index(user, start, end):
+    """Load a user's overrides in [start, end] keyed by (event_id, original_start)"""
+    overrides = OccurrenceOverride.objects.filter(
+        event__user=user,
+        original_start__gte=start,
+        original_start__lte=end,
+    )
+    return {(o.event_id, o.original_start): o for o in overrides}
+
+async def aget_override_index(user, start, end):
+    """Async version of get_override_index()"""
+    overrides = OccurrenceOverride.objects.filter(
+        event__user=user,
+        original_start__gte=start,
+        original_start__lte=end,
+    )
+    return {(o.event_id, o.original_start): o async for o in overrides}
@@ -1,7 +1,9 @@
 from rest_framework import serializers
-from .models import User, Event, OccurrenceOverride
+from .models import User, Event, ExportJob, OccurrenceOverride
+from rest_framework.reverse import reverse
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from .freebusy import MAX_REPORTED_CONFLICTS, event_conflicts
 User = get_user_model()
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -34,10 +36,11 @@ class EventSerializer(serializers.ModelSerializer):
             'month_week', 
             'month_weekday', 
             'until', 
+            'next_occurrence_at', 
             'created_at', 
             'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at', 'user']
+        read_only_fields = ['next_occurrence_at', 'created_at', 'updated_at', 'user']
         extra_kwargs = {
             'start': {'required': True},
             'end': {'required': True},
@@ -72,7 +75,26 @@ class EventSerializer(serializers.ModelSerializer):
             event.clean()
         except ValidationError as e:
             raise serializers.ValidationError(e.message_dict)
+        
+        if self.context.get('check_conflicts'):
+            self.check_conflicts(event)
         return data
+    def check_conflicts(self, event):
+        """Reject events whose occurrences overlap the user's other events"""
+        exclude = self.instance.pk if self.instance else None
+        conflicts = event_conflicts(self.context['request'].user, event, exclude=exclude)
+        if conflicts:
+            raise serializers.ValidationError({'conflicts': [
+                {
+                    'start': candidate[0].isoformat(),
+                    'end': candidate[1].isoformat(),
+                    'event': busy[2].id,
+                    'title': busy[2].title,
+                    'eventStart': busy[0].isoformat(),
+                    'eventEnd': busy[1].isoformat(),
+                }
+                for candidate, busy in conflicts[:MAX_REPORTED_CONFLICTS]
+            ]})
         
 
 class OccurrenceOverrideSerializer(serializers.ModelSerializer):
@@ -88,4 +110,33 @@ class OccurrenceOverrideSerializer(serializers.ModelSerializer):
             'created_at', 
             'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['created_at', 'updated_at']
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    download = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id',
+            'start',
+            'end',
+            'mode',
+            'status',
+            'size',
+            'error',
+            'download',
+            'created_at',
+            'started_at',
+            'finished_at'
+        ]
+        read_only_fields = ['status', 'size', 'error', 'created_at', 'started_at', 'finished_at']
+    def get_download(self, job):
+        if job.status != ExportJob.DONE:
+            return None
+        return reverse('export-job-download', args=[job.pk], request=self.context.get('request'))
+    def validate(self, data):
+        if data['start'] >= data['end']:
+            raise serializers.ValidationError("End time must be after start time")
+        return data
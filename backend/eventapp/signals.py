@@ -0,0 +1,80 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import materialization, upcoming
+from .versioning import bump_calendar_version
+from .models import Event, OccurrenceOverride
+
+_state = threading.local()
+
+
+@contextmanager
+def calendar_signals_deferred():
+    """Skip the per-row version bumps and rebuilds below for the enclosed writes.
+
+    For bulk writers, which then call bump_calendar_version() and
+    refresh_events() once for everything they touched.
+    """
+    previous = getattr(_state, 'deferred', False)
+    _state.deferred = True
+    try:
+        yield
+    finally:
+        _state.deferred = previous
+
+
+def _deferred():
+    return getattr(_state, 'deferred', False)
+
+
+def refresh_events(events):
+    """Bring data derived from events up to date after they or their overrides changed.
+
+    `events` holds Event instances or ids. next_occurrence_at and the
+    materialized occurrences are rebuilt in the caller's transaction, so they
+    become visible together with the calendar version bump.
+    """
+    events = list(events)
+    upcoming.refresh_next_occurrences(events)
+    if materialization.is_enabled():
+        materialization.rebuild_events([getattr(event, 'pk', event) for event in events])
+
+
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    if _deferred():
+        return
+    bump_calendar_version(instance.user_id)
+    upcoming.update_next_occurrences([instance])
+    if materialization.is_enabled():
+        materialization.rebuild_event(instance.pk)
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    if _deferred():
+        return
+    bump_calendar_version(instance.user_id)
+
+
+def _cascaded(origin, model):
+    """Whether rows of `model` are being deleted along with something else, e.g. their event"""
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is not model
+
+
+@receiver(post_save, sender=OccurrenceOverride)
+@receiver(post_delete, sender=OccurrenceOverride)
+def override_changed(sender, instance, origin=None, **kwargs):
+    # Deleting an event cascades to its overrides; event_deleted covers them
+    if _deferred() or _cascaded(origin, OccurrenceOverride):
+        return
+    # Resolve the owner in SQL rather than loading the event
+    bump_calendar_version(Event.objects.filter(pk=instance.event_id).values('user_id')[:1])
+    refresh_events([instance.event_id])
@@ -1,3 +1,1051 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from glob import glob
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from dateutil.rrule import rrulestr
+from icalendar import Calendar
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import calendar_cache, export_jobs, ical, materialization
+from .expansion import expand_windows, expand_windows_concurrently, materialized_windows
+from .freebusy import find_overlaps
+from .ics_import import import_ics
+from .models import Event, ExportJob, OccurrenceOverride, User
+from .payload import TimestampFormatter
+from .recurrence import aget_override_index, compile_rule, generate_occurrences, get_override_index, iter_occurrences
+from .upcoming import roll_next_occurrences
+
+
+class CalendarTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+        calendar_cache.get_cache().clear()
+
+    def create_daily_events(self, count):
+        for i in range(count):
+            event = Event.objects.create(
+                user=self.user,
+                title=f'Daily {i}',
+                start=self.start + timedelta(hours=9),
+                end=self.start + timedelta(hours=10),
+                is_recurring=True,
+                frequency='DAILY',
+            )
+            OccurrenceOverride.objects.create(
+                event=event,
+                original_start=self.start + timedelta(days=1, hours=9),
+                is_cancelled=True,
+            )
+        # Pick up the bumped calendar_version, as authentication would
+        self.user.refresh_from_db()
+
+
+class CalendarViewTests(CalendarTestCase):
+    def get_calendar(self, **params):
+        return self.client.get(reverse('calendar'), {
+            'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=30)).isoformat(),
+            **params,
+        })
+
+    def test_query_count_is_independent_of_occurrences(self):
+        self.create_daily_events(1)
+        with self.assertNumQueries(2):
+            response = self.get_calendar()
+        self.assertEqual(len(response.json()), 29)
+
+        self.create_daily_events(20)
+        with self.assertNumQueries(2):
+            response = self.get_calendar()
+        self.assertEqual(len(response.json()), 21 * 29)
+
+    def test_cancelled_occurrence_is_skipped(self):
+        self.create_daily_events(1)
+        response = self.get_calendar()
+        starts = [item['originalStart'] for item in response.json()]
+        self.assertNotIn((self.start + timedelta(days=1, hours=9)).isoformat(), starts)
+
+    def test_events_outside_window_are_not_loaded(self):
+        self.create_daily_events(1)
+        past = self.start - timedelta(days=400)
+        Event.objects.create(user=self.user, title='Old one-off', start=past, end=past + timedelta(hours=1))
+        Event.objects.create(
+            user=self.user, title='Ended series', start=past, end=past + timedelta(hours=1),
+            is_recurring=True, frequency='DAILY', until=past + timedelta(days=30),
+        )
+        future = self.start + timedelta(days=60)
+        Event.objects.create(user=self.user, title='Later', start=future, end=future + timedelta(hours=1))
+
+        events = Event.objects.overlapping(self.user, self.start, self.start + timedelta(days=30))
+        self.assertEqual([event.title for event in events], ['Daily 0'])
+
+    def test_unchanged_calendar_answers_304_without_queries(self):
+        self.create_daily_events(1)
+        etag = self.get_calendar()['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('calendar'), {
+                'start': self.start.isoformat(),
+                'end': (self.start + timedelta(days=30)).isoformat(),
+            }, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        OccurrenceOverride.objects.create(event=Event.objects.get(), original_start=self.start, is_cancelled=True)
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.get_calendar()['ETag'], etag)
+
+    def test_etag_depends_on_the_rendered_format(self):
+        self.create_daily_events(1)
+        json_response = self.get_calendar()
+        html_response = self.client.get(reverse('calendar'), {
+            'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=30)).isoformat(),
+        }, HTTP_ACCEPT='text/html')
+        self.assertNotEqual(json_response['ETag'], html_response['ETag'])
+        self.assertIn('Accept', json_response['Vary'])
+        self.assertNotIn('Last-Modified', json_response)
+
+    def test_repeat_view_is_served_from_cache(self):
+        self.create_daily_events(1)
+        first = self.get_calendar().json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_calendar().json(), first)
+        self.assertEqual(calendar_cache.get_stats()['hits'], 1)
+
+        Event.objects.get().delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.get_calendar().json(), [])
+        self.assertEqual(calendar_cache.get_stats()['misses'], 2)
+
+    def test_multiple_windows_in_one_request(self):
+        self.create_daily_events(3)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('calendar'), {'months': '2025-06,2025-07'})
+        june, july = response.json()
+        self.assertEqual(len(june['events']), 3 * 29)
+        self.assertEqual(len(july['events']), 3 * 31)
+
+        calendar_cache.get_cache().clear()
+        single = self.client.get(reverse('calendar'), {'start': june['start'], 'end': june['end']})
+        self.assertEqual(single.json(), june['events'])
+
+    def test_grouped_shape_lists_each_event_once(self):
+        self.create_daily_events(2)
+        flat = self.get_calendar().json()
+        grouped = self.get_calendar(shape='grouped').json()
+
+        self.assertEqual([group['title'] for group in grouped], ['Daily 0', 'Daily 1'])
+        self.assertNotIn('start', grouped[0])
+        self.assertEqual(
+            [[item['start'], item['end'], item['originalStart']] for item in flat if item['id'] == grouped[0]['id']],
+            grouped[0]['occurrences'],
+        )
+        self.assertEqual(self.get_calendar(shape='nested').status_code, 400)
+
+    def test_naive_windows_mix_with_months(self):
+        self.create_daily_events(1)
+        response = self.client.get(reverse('calendar'), {'window': '2025-06-01T00:00:00/2025-06-10T00:00:00', 'months': '2025-06'})
+        self.assertEqual(response.status_code, 200)
+        window, june = response.json()
+        self.assertEqual(window['start'], self.start.isoformat())
+        self.assertEqual(window['events'], june['events'][:len(window['events'])])
+
+    def test_invalid_window_is_rejected(self):
+        response = self.client.get(reverse('calendar'), {'window': '2025-06-30T00:00:00/2025-06-01T00:00:00'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pages_cover_the_window_in_order(self):
+        self.create_daily_events(3)
+        expected = sorted(self.get_calendar().json(), key=lambda item: (item['originalStart'], item['id']))
+
+        pages = []
+        url, params = reverse('calendar'), {
+            'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=30)).isoformat(),
+            'limit': 10,
+        }
+        while url:
+            response = self.client.get(url, params)
+            pages.append(response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual([len(page) for page in pages], [10] * 8 + [7])
+        self.assertEqual([item for page in pages for item in page], expected)
+
+    def test_cursor_with_naive_timestamp_is_rejected(self):
+        self.create_daily_events(1)
+        cursor = base64.urlsafe_b64encode(b'2025-06-03T09:00:00|1').decode()
+        response = self.get_calendar(limit=10, cursor=cursor)
+        self.assertEqual(response.status_code, 400)
+        # Naive window bounds are taken in the current time zone
+        response = self.client.get(reverse('calendar'), {'start': '2025-06-01T00:00:00', 'end': '2025-06-10T00:00:00', 'limit': 3})
+        self.assertEqual(len(response.data['results']), 3)
+
+
+class ExportCalendarViewTests(CalendarTestCase):
+    def get_export(self):
+        return self.client.get(reverse('export-calendar'), {
+            'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=30)).isoformat(),
+        })
+
+    def test_export_streams_one_vevent_per_occurrence(self):
+        self.create_daily_events(2)
+        response = self.get_export()
+        self.assertTrue(response.streaming)
+        cal = Calendar.from_ical(b''.join(response.streaming_content))
+        events = cal.walk('VEVENT')
+        self.assertEqual(len(events), 2 * 29)
+        self.assertEqual(str(events[0]['summary']), 'Daily 0')
+
+    def test_overrides_are_loaded_per_event_chunk(self):
+        self.create_daily_events(3)
+        with patch('eventapp.ical.EXPORT_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            events = Calendar.from_ical(b''.join(self.get_export().streaming_content)).walk('VEVENT')
+        self.assertEqual(len(events), 3 * 29)
+        override_queries = [q for q in queries if 'eventapp_occurrenceoverride' in q['sql']]
+        self.assertEqual(len(override_queries), 2)
+
+    def test_naive_window_exports_a_complete_file(self):
+        self.create_daily_events(1)
+        response = self.client.get(reverse('export-calendar'), {'start': '2025-06-01T00:00:00', 'end': '2025-06-05T00:00:00'})
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.endswith(b'END:VCALENDAR\r\n'))
+        self.assertEqual(len(Calendar.from_ical(content).walk('VEVENT')), 3)
+
+    def test_series_mode_writes_one_master_per_series(self):
+        self.create_daily_events(1)
+        event = Event.objects.get()
+        moved = self.start + timedelta(days=3, hours=9)
+        OccurrenceOverride.objects.create(event=event, original_start=moved, new_start=moved + timedelta(hours=2))
+
+        response = self.client.get(reverse('export-calendar'), {
+            'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=30)).isoformat(),
+            'mode': 'series',
+        })
+        master, child = Calendar.from_ical(b''.join(response.streaming_content)).walk('VEVENT')
+        self.assertEqual(master['rrule']['FREQ'], ['DAILY'])
+        self.assertEqual(master['exdate'].dts[0].dt, self.start + timedelta(days=1, hours=9))
+        self.assertEqual(child['recurrence-id'].dt, moved)
+        self.assertEqual(child['dtstart'].dt, moved + timedelta(hours=2))
+
+    def test_series_rrule_matches_generated_occurrences(self):
+        anchor = datetime(2024, 1, 10, 9, tzinfo=timezone.utc)
+        patterns = [
+            {'frequency': 'DAILY', 'interval': 3},
+            {'frequency': 'WEEKLY', 'interval': 2, 'weekdays': 'MO,TH,SU'},
+            {'frequency': 'MONTHLY', 'interval': 1, 'month_day': 31},
+            {'frequency': 'MONTHLY', 'interval': 2, 'month_week': -1, 'month_weekday': 4},
+            {'frequency': 'YEARLY', 'interval': 1},
+            # Months without a 5th Friday are skipped, bounded or not
+            {'frequency': 'MONTHLY', 'interval': 1, 'month_week': 5, 'month_weekday': 4, 'until': anchor + timedelta(days=700)},
+            {'frequency': 'MONTHLY', 'interval': 1, 'month_week': 5, 'month_weekday': 4},
+        ]
+        window_end = anchor + timedelta(days=800)
+        for pattern in patterns:
+            with self.subTest(**pattern):
+                event = Event(pk=1, start=anchor, end=anchor + timedelta(hours=1), is_recurring=True, **pattern)
+                self.assertEqual(self.exported_instances(event, window_end), generate_occurrences(event, anchor, window_end))
+
+    def exported_instances(self, event, window_end):
+        master = ical.series_components(event, [], event.start)[0]
+        rule = rrulestr(master['rrule'].to_ical().decode(), dtstart=event.start)
+        exdates = {d.dt for d in master['exdate'].dts} if 'exdate' in master else set()
+        # DTSTART is always the first instance, even when it does not match the rule
+        instances = {event.start} | set(rule.between(event.start, window_end, inc=True))
+        return sorted(instance for instance in instances - exdates if instance <= window_end)
+
+    @override_settings(EXPORT_PROCESSES=2)
+    def test_parallel_export_matches_serial(self):
+        def vevents(params):
+            response = self.client.get(reverse('export-calendar'), {
+                'start': self.start.isoformat(),
+                'end': (self.start + timedelta(days=30)).isoformat(),
+                **params,
+            })
+            lines = b''.join(response.streaming_content).split(b'\r\n')
+            return [line for line in lines if not line.startswith(b'DTSTAMP')]
+
+        self.create_daily_events(3)
+        event = Event.objects.first()
+        moved = self.start + timedelta(days=3, hours=9)
+        OccurrenceOverride.objects.create(event=event, original_start=moved, new_start=moved + timedelta(hours=2))
+        response = self.client.get(reverse('export-calendar'), {
+            'start': self.start.isoformat(), 'end': (self.start + timedelta(days=30)).isoformat(), 'parallel': 'true',
+        })
+        self.assertEqual(response.status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        with patch('eventapp.parallel_export.CHUNK_SIZE', 1):
+            for mode in ('occurrences', 'series'):
+                with self.subTest(mode=mode):
+                    self.assertEqual(vevents({'mode': mode, 'parallel': 'true'}), vevents({'mode': mode}))
+
+
+class ExportJobTests(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        export_root = TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        settings = self.settings(EXPORT_ROOT=export_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.create_daily_events(2)
+        self.params = {
+            'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=30)).isoformat(),
+        }
+
+    def run_export(self):
+        response = self.client.post(reverse('export-job-list'), self.params, format='json')
+        call_command('run_export_jobs', '--once', stdout=StringIO())
+        return self.client.get(reverse('export-job-detail', args=[response.data['id']])).data
+
+    def test_export_job_lifecycle(self):
+        response = self.client.post(reverse('export-job-list'), self.params, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertIsNone(response.data['download'])
+
+        call_command('run_export_jobs', '--once', stdout=StringIO())
+        job = self.client.get(reverse('export-job-detail', args=[response.data['id']])).data
+        self.assertEqual(job['status'], 'done')
+
+        download = self.client.get(job['download'])
+        content = b''.join(download.streaming_content)
+        self.assertEqual(len(content), job['size'])
+        self.assertEqual(len(Calendar.from_ical(content).walk('VEVENT')), 2 * 29)
+
+    def test_unchanged_calendar_reuses_finished_export(self):
+        first = self.run_export()
+        response = self.client.post(reverse('export-job-list'), self.params, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], first['id'])
+
+        Event.objects.create(user=self.user, title='New', start=self.start, end=self.start + timedelta(hours=1))
+        self.user.refresh_from_db()
+        response = self.client.post(reverse('export-job-list'), self.params, format='json')
+        self.assertEqual(response.status_code, 202)
+
+    def test_download_supports_ranges(self):
+        job = self.run_export()
+        full = b''.join(self.client.get(job['download']).streaming_content)
+        etag = f'"export-{job["id"]}-{len(full)}"'
+
+        response = self.client.get(job['download'], HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-{len(full) - 1}/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[100:])
+
+        response = self.client.get(job['download'], HTTP_RANGE='bytes=-10', HTTP_IF_RANGE=etag)
+        self.assertEqual(b''.join(response.streaming_content), full[-10:])
+        response = self.client.get(job['download'], HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(job['download'], HTTP_RANGE=f'bytes={len(full)}-')
+        self.assertEqual(response.status_code, 416)
+
+    @patch('eventapp.export_jobs.HEARTBEAT_INTERVAL', 0)
+    def test_reclaimed_job_is_left_to_its_new_owner(self):
+        self.client.post(reverse('export-job-list'), self.params, format='json')
+        stale = export_jobs.claim_next_job()
+        # Another worker takes the job over after a missed heartbeat
+        ExportJob.objects.filter(pk=stale.pk).update(started_at=stale.started_at + timedelta(minutes=20))
+        current = ExportJob.objects.get(pk=stale.pk)
+
+        path = export_jobs.job_path(stale)
+        self.assertIsNone(export_jobs.run_job(stale))
+        self.assertFalse(os.path.exists(path))
+
+        claim = current.started_at
+        self.assertEqual(export_jobs.run_job(current).status, ExportJob.DONE)
+        current.refresh_from_db()
+        self.assertNotEqual(current.started_at, claim)  # heartbeats while streaming
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(glob(f'{path}.*.part'), [])
+
+
+class OverrideBatchTests(CalendarTestCase):
+    def post_overrides(self, event, **data):
+        return self.client.post(reverse('event-overrides', args=[event.pk]), data, format='json')
+
+    def test_cancel_range_upserts_in_one_statement(self):
+        self.create_daily_events(1)
+        event = Event.objects.get()
+        july = {'start': datetime(2025, 7, 1, tzinfo=timezone.utc).isoformat(),
+                'end': datetime(2025, 7, 31, 23, 59, tzinfo=timezone.utc).isoformat()}
+
+        with self.assertNumQueries(6):
+            response = self.post_overrides(event, action='cancel', **july)
+        self.assertEqual(response.data, {'updated': 31})
+        self.post_overrides(event, action='cancel', **july)
+        self.assertEqual(event.overrides.count(), 1 + 31)
+        self.assertTrue(all(event.overrides.values_list('is_cancelled', flat=True)))
+
+    def test_shift_moves_occurrences_from_their_current_time(self):
+        self.create_daily_events(1)
+        event = Event.objects.get()
+        day = lambda n: (self.start + timedelta(days=n, hours=9)).isoformat()
+        self.post_overrides(event, action='shift', shift='PT2H', original_starts=[day(2)])
+
+        response = self.post_overrides(event, action='shift', shift='01:00:00', original_starts=[day(1), day(2), day(3)])
+        self.assertEqual(response.data, {'updated': 2})  # day 1 is cancelled
+        moved = event.overrides.get(original_start=day(2))
+        self.assertEqual((moved.new_start, moved.new_end), (
+            self.start + timedelta(days=2, hours=12), self.start + timedelta(days=2, hours=13),
+        ))
+        self.assertTrue(event.overrides.get(original_start=day(1)).is_cancelled)
+
+    def test_starts_that_are_not_occurrences_are_rejected(self):
+        self.create_daily_events(1)
+        event = Event.objects.get()
+        response = self.post_overrides(event, action='cancel', original_starts=[self.start.isoformat()])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['original_starts'], [self.start.isoformat()])
+
+    def test_naive_starts_are_taken_in_the_current_time_zone(self):
+        self.create_daily_events(1)
+        event = Event.objects.get()
+        response = self.post_overrides(event, action='cancel', original_starts=['2025-06-03T09:00:00'])
+        self.assertEqual(response.data, {'updated': 1})
+        self.assertTrue(event.overrides.get(original_start=self.start + timedelta(days=2, hours=9)).is_cancelled)
+
+
+class SplitSeriesTests(CalendarTestCase):
+    def test_split_moves_later_overrides_to_successor(self):
+        self.create_daily_events(1)
+        event = Event.objects.get()
+        day = lambda n: self.start + timedelta(days=n, hours=9)
+        OccurrenceOverride.objects.create(event=event, original_start=day(12), new_start=day(12) + timedelta(hours=1))
+        OccurrenceOverride.objects.create(event=event, original_start=day(14), is_cancelled=True)
+
+        response = self.client.post(reverse('event-split', args=[event.pk]), {
+            'original_start': day(10).isoformat(),
+            'title': 'Daily, renamed',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['movedOverrides'], response.data['droppedOverrides']), (2, 0))
+
+        event.refresh_from_db()
+        successor = Event.objects.get(pk=response.data['successor']['id'])
+        self.assertEqual(event.until, day(10) - timedelta(microseconds=1))
+        self.assertEqual((successor.start, successor.until), (day(10), None))
+        self.assertEqual(list(event.overrides.values_list('original_start', flat=True)), [day(1)])
+        self.assertEqual(successor.overrides.count(), 2)
+
+        self.user.refresh_from_db()
+        calendar = self.client.get(reverse('calendar'), {
+            'start': self.start.isoformat(), 'end': day(20).isoformat(),
+        }).json()
+        titles = {item['originalStart']: item['title'] for item in calendar}
+        self.assertEqual(len(calendar), 21 - 2)
+        self.assertEqual(titles[day(9).isoformat()], 'Daily 0')
+        self.assertEqual(titles[day(10).isoformat()], 'Daily, renamed')
+
+    def test_split_rejects_non_occurrences(self):
+        self.create_daily_events(1)
+        event = Event.objects.get()
+        for original_start in (self.start.isoformat(), (self.start + timedelta(hours=9)).isoformat(), '2025-06-03T10:00:00'):
+            response = self.client.post(reverse('event-split', args=[event.pk]), {
+                'original_start': original_start,
+            }, format='json')
+            self.assertEqual(response.status_code, 400)
+
+        # Naive values are taken in the current time zone
+        response = self.client.post(reverse('event-split', args=[event.pk]), {
+            'original_start': '2025-06-03T09:00:00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+
+class CompactOverridesTests(CalendarTestCase):
+    def test_removes_orphaned_redundant_and_stale_overrides(self):
+        self.create_daily_events(1)
+        event = Event.objects.get()
+        day = lambda n: self.start + timedelta(days=n, hours=9)
+        kept = OccurrenceOverride.objects.create(event=event, original_start=day(40), is_cancelled=True)
+        OccurrenceOverride.objects.create(event=event, original_start=day(3) + timedelta(hours=1), is_cancelled=True)
+        OccurrenceOverride.objects.create(event=event, original_start=day(4), new_start=day(4))
+        # Past the series end once until is set below
+        OccurrenceOverride.objects.create(event=event, original_start=day(60), is_cancelled=True)
+        Event.objects.filter(pk=event.pk).update(until=day(50), updated_at=datetime.now(timezone.utc))
+
+        out = StringIO()
+        retention_days = (datetime.now(timezone.utc) - day(30)).days
+        archive_dir = TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        archive = os.path.join(archive_dir.name, 'overrides.jsonl')
+        call_command('compact_overrides', '--dry-run', f'--archive={archive}', stdout=out)
+        self.assertIn('Would remove 3 of 5 overrides (2 orphaned, 1 redundant, 0 stale)', out.getvalue())
+        self.assertEqual(OccurrenceOverride.objects.count(), 5)
+        with open(archive) as lines:
+            self.assertEqual(lines.read(), '')
+
+        call_command('compact_overrides', f'--retention-days={retention_days}', '--batch-size=1',
+                     f'--archive={archive}', stdout=out)
+        self.assertIn('Removed 4 of 5 overrides (2 orphaned, 1 redundant, 1 stale)', out.getvalue())
+        self.assertEqual(list(OccurrenceOverride.objects.all()), [kept])
+        with open(archive) as lines:
+            self.assertEqual(sorted(json.loads(line)['reason'] for line in lines),
+                             ['orphaned', 'orphaned', 'redundant', 'stale'])
+
+
+class UpcomingEventsTests(CalendarTestCase):
+    def test_upcoming_orders_by_next_occurrence(self):
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        daily = Event.objects.create(
+            user=self.user, title='Daily', start=now - timedelta(days=10, hours=1),
+            end=now - timedelta(days=10), is_recurring=True, frequency='DAILY',
+        )
+        Event.objects.create(user=self.user, title='Tomorrow', start=now + timedelta(days=1), end=now + timedelta(days=1, hours=1))
+        Event.objects.create(user=self.user, title='Past', start=now - timedelta(days=1), end=now - timedelta(hours=23))
+        self.assertEqual(daily.next_occurrence_at, now + timedelta(hours=23))
+
+        # Cancelling the next occurrence moves the series to the one after
+        OccurrenceOverride.objects.create(event=daily, original_start=now + timedelta(hours=23), is_cancelled=True)
+        daily.refresh_from_db()
+        self.assertEqual(daily.next_occurrence_at, now + timedelta(days=1, hours=23))
+
+        response = self.client.get(reverse('event-list'), {'upcoming': 'true', 'limit': 5})
+        self.assertEqual([event['title'] for event in response.data], ['Tomorrow', 'Daily'])
+
+    def test_roll_moves_past_occurrences_forward(self):
+        now = datetime.now(timezone.utc)
+        daily = Event.objects.create(
+            user=self.user, title='Daily', start=now - timedelta(days=3), end=now - timedelta(days=3) + timedelta(hours=1),
+            is_recurring=True, frequency='DAILY',
+        )
+        later = now + timedelta(days=2, hours=1)
+        self.assertEqual(roll_next_occurrences(later), 1)
+        daily.refresh_from_db()
+        self.assertGreaterEqual(daily.next_occurrence_at, later)
+        self.assertEqual(roll_next_occurrences(later), 0)
+
+    def test_event_delete_cost_is_independent_of_overrides(self):
+        def delete_queries(override_count):
+            event = Event.objects.create(
+                user=self.user, title='Daily', start=self.start, end=self.start + timedelta(hours=1),
+                is_recurring=True, frequency='DAILY',
+            )
+            OccurrenceOverride.objects.bulk_create(
+                OccurrenceOverride(event=event, original_start=self.start + timedelta(days=i), is_cancelled=True)
+                for i in range(override_count)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                event.delete()
+            return len(queries)
+
+        version = User.objects.get(pk=self.user.pk).calendar_version
+        self.assertEqual(delete_queries(1), delete_queries(10))
+        self.assertEqual(User.objects.get(pk=self.user.pk).calendar_version, version + 4)
+
+
+class FreeBusyTests(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.daily = Event.objects.create(
+            user=self.user, title='Standup', start=self.start + timedelta(hours=9),
+            end=self.start + timedelta(hours=10), is_recurring=True, frequency='DAILY',
+        )
+        Event.objects.create(
+            user=self.user, title='Workshop', start=self.start + timedelta(hours=9, minutes=30),
+            end=self.start + timedelta(hours=11),
+        )
+        OccurrenceOverride.objects.create(
+            event=self.daily, original_start=self.start + timedelta(days=1, hours=9), is_cancelled=True,
+        )
+
+    def test_freebusy_merges_overlapping_occurrences(self):
+        response = self.client.get(reverse('calendar-freebusy'), {
+            'start': (self.start + timedelta(hours=8)).isoformat(),
+            'end': (self.start + timedelta(days=2, hours=12)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        at = lambda days, hours: (self.start + timedelta(days=days, hours=hours)).isoformat()
+        self.assertEqual(response.data['busy'], [
+            {'start': at(0, 9), 'end': at(0, 11)},
+            {'start': at(2, 9), 'end': at(2, 10)},
+        ])
+        self.assertEqual(response.data['free'], [
+            {'start': at(0, 8), 'end': at(0, 9)},
+            {'start': at(0, 11), 'end': at(2, 9)},
+            {'start': at(2, 10), 'end': at(2, 12)},
+        ])
+
+    def test_freebusy_counts_occurrences_started_before_window(self):
+        response = self.client.get(reverse('calendar-freebusy'), {
+            'start': (self.start + timedelta(hours=10, minutes=30)).isoformat(),
+            'end': (self.start + timedelta(hours=12)).isoformat(),
+        })
+        self.assertEqual(response.data['busy'], [{
+            'start': (self.start + timedelta(hours=10, minutes=30)).isoformat(),
+            'end': (self.start + timedelta(hours=11)).isoformat(),
+        }])
+
+    def test_conflicting_create_is_rejected_when_checked(self):
+        data = {
+            'title': 'Review', 'start': (self.start + timedelta(days=3, hours=9, minutes=45)).isoformat(),
+            'end': (self.start + timedelta(days=3, hours=10, minutes=15)).isoformat(),
+        }
+        response = self.client.post(reverse('event-list') + '?check_conflicts=true', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([c['title'] for c in response.data['conflicts']], ['Standup'])
+
+        # Unchecked creates and non-overlapping times are still accepted
+        self.assertEqual(self.client.post(reverse('event-list'), data, format='json').status_code, 201)
+        data['start'] = (self.start + timedelta(days=1, hours=9, minutes=15)).isoformat()
+        data['end'] = (self.start + timedelta(days=1, hours=9, minutes=45)).isoformat()
+        response = self.client.post(reverse('event-list') + '?check_conflicts=true', data, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_update_does_not_conflict_with_itself(self):
+        data = {
+            'title': 'Standup', 'start': (self.start + timedelta(hours=8)).isoformat(),
+            'end': (self.start + timedelta(hours=9)).isoformat(), 'is_recurring': True, 'frequency': 'DAILY',
+        }
+        url = reverse('event-detail', args=[self.daily.pk]) + '?check_conflicts=true'
+        self.assertEqual(self.client.put(url, data, format='json').status_code, 200)
+
+    def test_find_overlaps_matches_brute_force(self):
+        rng = random.Random(7)
+        def intervals(n):
+            starts = sorted(rng.randrange(1000) for _ in range(n))
+            return [(s, s + rng.randrange(1, 50)) for s in starts]
+        candidates, busy = intervals(200), intervals(300)
+        expected = {(c, b) for c in candidates for b in busy if c[0] < b[1] and b[0] < c[1]}
+        self.assertEqual(set(find_overlaps(candidates, busy)), expected)
+
+
+class AvailabilityTests(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bob = User.objects.create_user(username='bob', password='secret')
+        self.monday = self.start + timedelta(days=1)
+        Event.objects.create(
+            user=self.user, title='Standup', start=self.start + timedelta(hours=9),
+            end=self.start + timedelta(hours=10), is_recurring=True, frequency='DAILY',
+        )
+        Event.objects.create(
+            user=self.bob, title='Interviews', start=self.monday + timedelta(hours=10),
+            end=self.monday + timedelta(hours=12, minutes=15),
+        )
+
+    def search(self, **params):
+        params = {
+            'participants': str(self.bob.pk), 'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=7)).isoformat(), 'duration': '01:00:00', 'tz': 'UTC', **params,
+        }
+        return self.client.get(reverse('calendar-availability'), params)
+
+    def test_first_common_slots_in_working_hours(self):
+        response = self.search(limit=3, step='00:30:00')
+        self.assertEqual(response.status_code, 200)
+        # Sunday is skipped; on Monday Alice is busy 9-10 and Bob 10-12:15
+        at = lambda hours, minutes=0: self.monday + timedelta(hours=hours, minutes=minutes)
+        self.assertEqual(response.data['slots'], [
+            {'start': at(12, 15).isoformat(), 'end': at(13, 15).isoformat()},
+            {'start': at(12, 45).isoformat(), 'end': at(13, 45).isoformat()},
+            {'start': at(13, 15).isoformat(), 'end': at(14, 15).isoformat()},
+        ])
+
+    def test_slots_respect_local_working_hours(self):
+        response = self.search(limit=1, tz='Europe/Berlin', work_start='14:00', work_end='18:00')
+        # 14:00 in Berlin is 12:00 UTC, still inside Bob's interviews
+        self.assertEqual(response.data['slots'][0]['start'], (self.monday + timedelta(hours=12, minutes=15)).isoformat())
+
+    def test_invalid_searches(self):
+        self.assertEqual(self.search(participants='US-99').status_code, 400)
+        self.assertEqual(self.search(duration='soon').status_code, 400)
+        self.assertEqual(self.search(end=(self.start + timedelta(days=365)).isoformat()).status_code, 400)
+        self.assertEqual(self.search(weekdays='MO,XX').status_code, 400)
+
+
+class AsyncCalendarTests(CalendarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_daily_events(3)
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        self.window = {
+            'start': self.start.isoformat(),
+            'end': (self.start + timedelta(days=14)).isoformat(),
+        }
+
+    async def test_calendar_matches_sync_view(self):
+        naive = {'start': '2025-06-01T00:00:00', 'end': '2025-06-14T00:00:00'}
+        for params in [{**self.window, 'shape': 'grouped'}, {'months': '2025-06,2025-07'}, naive]:
+            response = await self.async_client.get(reverse('calendar-async'), params, headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('ETag', response)
+            await sync_to_async(calendar_cache.get_cache().clear)()
+            expected = await sync_to_async(self.client.get)(reverse('calendar'), params)
+            self.assertEqual(response.json(), expected.json())
+
+    async def test_export_matches_sync_view(self):
+        def without_dtstamp(content):
+            return [line for line in content.split(b'\r\n') if not line.startswith(b'DTSTAMP')]
+
+        for mode in ('occurrences', 'series'):
+            params = {**self.window, 'mode': mode}
+            response = await self.async_client.get(reverse('export-calendar-async'), params, headers=self.auth)
+            # One event per batch, so each batch has to load its own overrides
+            with patch('eventapp.async_views.EXPANSION_BATCH_SIZE', 1):
+                content = b''.join([chunk async for chunk in response.streaming_content])
+            # Each event's cancelled second occurrence is left out
+            if mode == 'series':
+                self.assertEqual(content.count(b'EXDATE'), 3)
+            else:
+                self.assertEqual(content.count(b'BEGIN:VEVENT'), 3 * 13)
+            expected = await sync_to_async(
+                lambda: b''.join(self.client.get(reverse('export-calendar'), params).streaming_content)
+            )()
+            self.assertEqual(without_dtstamp(content), without_dtstamp(expected))
+
+    async def test_requires_token(self):
+        response = await self.async_client.get(reverse('calendar-async'), self.window)
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(reverse('calendar-async'), self.window, headers={'Authorization': 'Bearer nonsense'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_batched_expansion_matches_serial(self):
+        windows = [(self.start, self.start + timedelta(days=3)), (self.start + timedelta(days=2), self.start + timedelta(days=9))]
+        events = [event async for event in Event.objects.overlapping(self.user, self.start, windows[1][1])]
+        overrides = await aget_override_index(self.user, self.start, windows[1][1])
+        self.assertEqual(
+            await expand_windows_concurrently(events, overrides, windows, batch_size=1),
+            expand_windows(events, overrides, windows),
+        )
+
+
+class ImportCalendarTests(CalendarTestCase):
+    def test_series_export_round_trips_through_import(self):
+        self.create_daily_events(2)
+        event = Event.objects.first()
+        moved = self.start + timedelta(days=3, hours=9)
+        OccurrenceOverride.objects.create(event=event, original_start=moved, new_start=moved + timedelta(hours=2))
+        Event.objects.create(
+            user=self.user, title='Board meeting', start=self.start + timedelta(hours=14),
+            end=self.start + timedelta(hours=15), is_recurring=True, frequency='MONTHLY',
+            month_week=-1, month_weekday=4,
+        )
+        params = {'start': self.start.isoformat(), 'end': (self.start + timedelta(days=90)).isoformat()}
+        ics = b''.join(self.client.get(reverse('export-calendar'), {**params, 'mode': 'series'}).streaming_content)
+        self.user.refresh_from_db()
+        original = self.client.get(reverse('calendar'), params).json()
+
+        other = User.objects.create_user(username='bob', password='secret')
+        self.client.force_authenticate(other)
+        upload = SimpleUploadedFile('calendar.ics', ics, content_type='text/calendar')
+        response = self.client.post(reverse('import-calendar'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        # Two cancellations, one move and the EXDATE for the RRULE's extra June instance
+        self.assertEqual((response.data['events'], response.data['overrides'], response.data['skipped']), (3, 4, 0))
+
+        imported = self.client.get(reverse('calendar'), params).json()
+        key = lambda item: (item['title'], item['originalStart'])
+        strip = lambda items: sorted(({k: v for k, v in item.items() if k != 'id'} for item in items), key=key)
+        self.assertEqual(strip(imported), strip(original))
+
+    def test_instances_before_their_master_and_unsupported_rules(self):
+        ics = (
+            b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+            b'BEGIN:VEVENT\r\nUID:standup\r\nRECURRENCE-ID:20250603T090000Z\r\n'
+            b'DTSTART:20250603T090000Z\r\nSTATUS:CANCELLED\r\nEND:VEVENT\r\n'
+            b'BEGIN:VEVENT\r\nUID:standup\r\nSUMMARY:Stand\r\n up\r\nDTSTART:20250602T090000Z\r\n'
+            b'DURATION:PT15M\r\nRRULE:FREQ=WEEKLY;BYDAY=MO,TU;COUNT=4\r\nEND:VEVENT\r\n'
+            b'BEGIN:VEVENT\r\nUID:hourly\r\nDTSTART:20250602T090000Z\r\nRRULE:FREQ=HOURLY\r\nEND:VEVENT\r\n'
+            b'END:VCALENDAR\r\n'
+        )
+        result = import_ics(self.user, BytesIO(ics), batch_size=1)
+        self.assertEqual((result['events'], result['overrides'], result['skipped']), (1, 1, 1))
+
+        event = Event.objects.get()
+        self.assertEqual(event.title, 'Standup')
+        self.assertEqual((event.weekdays, event.until), ('MO,TU', self.start + timedelta(days=9, hours=9)))
+        self.assertEqual(event.end - event.start, timedelta(minutes=15))
+        self.assertTrue(event.overrides.get().is_cancelled)
+
+    def test_rejects_degenerate_rules_and_counts_stored_overrides(self):
+        ics = (
+            b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+            b'BEGIN:VEVENT\r\nUID:zero\r\nDTSTART:20990602T090000Z\r\nRRULE:FREQ=DAILY;INTERVAL=0\r\nEND:VEVENT\r\n'
+            b'BEGIN:VEVENT\r\nUID:past\r\nDTSTART:20200602T090000Z\r\nRRULE:FREQ=DAILY;INTERVAL=0;COUNT=3\r\nEND:VEVENT\r\n'
+            b'BEGIN:VEVENT\r\nUID:negative\r\nDTSTART:20250602T090000Z\r\nRRULE:FREQ=DAILY;INTERVAL=-1\r\nEND:VEVENT\r\n'
+            b'BEGIN:VEVENT\r\nUID:huge\r\nDTSTART:20250602T090000Z\r\nRRULE:FREQ=DAILY;COUNT=999999999\r\nEND:VEVENT\r\n'
+            b'BEGIN:VEVENT\r\nUID:daily\r\nDTSTART:20250602T090000Z\r\nRRULE:FREQ=DAILY;COUNT=5\r\n'
+            b'EXDATE:20250603T090000Z\r\nEND:VEVENT\r\n'
+            b'BEGIN:VEVENT\r\nUID:daily\r\nRECURRENCE-ID:20250603T090000Z\r\n'
+            b'DTSTART:20250603T090000Z\r\nSTATUS:CANCELLED\r\nEND:VEVENT\r\n'
+            b'END:VCALENDAR\r\n'
+        )
+        result = import_ics(self.user, BytesIO(ics))
+        self.assertEqual((result['events'], result['overrides'], result['skipped']), (1, 1, 4))
+        self.assertEqual(Event.objects.get().until, self.start + timedelta(days=5, hours=9))
+
+
+@override_settings(OCCURRENCE_MATERIALIZATION=True)
+class MaterializedCalendarTests(CalendarViewTests):
+    def create_daily_events(self, count):
+        super().create_daily_events(count)
+        history_days = (datetime.now(timezone.utc) - self.start).days + 1
+        materialization.extend_horizon(days=30, history_days=history_days, rebuild=True)
+
+    def test_matches_expanded_calendar(self):
+        self.create_daily_events(3)
+        materialized = self.get_calendar().json()
+        calendar_cache.get_cache().clear()
+        with self.settings(OCCURRENCE_MATERIALIZATION=False):
+            expanded = self.get_calendar().json()
+        key = lambda item: (item['start'], item['id'])
+        self.assertEqual(sorted(materialized, key=key), sorted(expanded, key=key))
+
+    def test_override_change_rebuilds_only_its_event(self):
+        self.create_daily_events(2)
+        first, second = Event.objects.order_by('pk')
+        untouched = set(second.occurrences.values_list('pk', flat=True))
+
+        # Rebuilt in the write's own transaction, not after commit
+        with self.captureOnCommitCallbacks() as callbacks:
+            OccurrenceOverride.objects.create(
+                event=first,
+                original_start=self.start + timedelta(days=2, hours=9),
+                new_start=self.start + timedelta(days=2, hours=15),
+            )
+
+        self.assertEqual(callbacks, [])
+        moved = first.occurrences.get(original_start=self.start + timedelta(days=2, hours=9))
+        self.assertEqual(moved.start, self.start + timedelta(days=2, hours=15))
+        self.assertEqual(moved.end, self.start + timedelta(days=2, hours=16))
+        self.assertEqual(set(second.occurrences.values_list('pk', flat=True)), untouched)
+
+    def test_moved_occurrence_stays_in_its_original_window(self):
+        self.create_daily_events(2)
+        first = Event.objects.order_by('pk').first()
+        original = self.start + timedelta(days=2, hours=9)
+        OccurrenceOverride.objects.create(event=first, original_start=original, new_start=original + timedelta(days=2))
+        windows = [(self.start, self.start + timedelta(days=3)), (self.start + timedelta(days=3), self.start + timedelta(days=6))]
+
+        span_end = windows[1][1]
+        events = list(Event.objects.overlapping(self.user, self.start, span_end).order_by('pk'))
+        expanded = expand_windows(events, get_override_index(self.user, self.start, span_end), windows)
+        materialized = materialized_windows(self.user, windows)
+        self.assertEqual(materialized, expanded)
+        # Grouped under the window holding its original start, not its new one
+        original_starts = lambda groups: {row[2] for _, rows in groups for row in rows}
+        self.assertIn(TimestampFormatter()(original), original_starts(materialized[0]))
+        self.assertNotIn(TimestampFormatter()(original), original_starts(materialized[1]))
+
+
+class BulkEventTests(CalendarTestCase):
+    def event_data(self, i, **extra):
+        start = self.start + timedelta(days=i, hours=9)
+        return {'title': f'Imported {i}', 'start': start.isoformat(), 'end': (start + timedelta(hours=1)).isoformat(), **extra}
+
+    def test_bulk_writes_in_one_transaction(self):
+        self.create_daily_events(2)
+        first, second = Event.objects.order_by('pk')
+        version = self.user.calendar_version
+
+        with self.assertNumQueries(13):
+            response = self.client.post(reverse('event-bulk'), {
+                'create': [self.event_data(i) for i in range(50)],
+                'update': [{'id': first.pk, **self.event_data(0, title='Renamed')}],
+                'delete': [second.pk],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['created']), 50)
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertEqual(Event.objects.filter(title__startswith='Imported').count(), 50)
+        self.assertEqual(Event.objects.get(pk=first.pk).title, 'Renamed')
+        self.assertFalse(Event.objects.filter(pk=second.pk).exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.calendar_version, version + 1)
+
+    def test_invalid_items_are_reported_and_nothing_is_written(self):
+        other = User.objects.create_user(username='bob', password='secret')
+        foreign = Event.objects.create(user=other, title='Private', start=self.start, end=self.start + timedelta(hours=1))
+
+        response = self.client.post(reverse('event-bulk'), {
+            'create': [self.event_data(0), self.event_data(1, end=self.start.isoformat())],
+            'update': [{'id': foreign.pk, **self.event_data(2)}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['create'][0], {})
+        self.assertIn('non_field_errors', response.data['create'][1])
+        self.assertIn('id', response.data['update'][0])
+        self.assertFalse(Event.objects.filter(user=self.user).exists())
+
+    def test_bulk_delete_overrides(self):
+        self.create_daily_events(2)
+        first, second = Event.objects.order_by('pk')
+        cancelled = (self.start + timedelta(days=1, hours=9)).isoformat()
+
+        response = self.client.post(reverse('occurrence-bulk-delete'), [
+            {'event': first.pk, 'original_start': cancelled},
+            {'event': second.pk, 'original_start': self.start.isoformat()},
+        ], format='json')
+        self.assertEqual(response.data, {'deleted': 1})
+        self.assertEqual(list(OccurrenceOverride.objects.values_list('event_id', flat=True)), [second.pk])
+
+        # Naive times are taken in the current time zone (UTC)
+        response = self.client.post(reverse('occurrence-bulk-delete'), [
+            {'event': second.pk, 'original_start': '2025-06-02T09:00:00'},
+        ], format='json')
+        self.assertEqual(response.data, {'deleted': 1})
+
+        response = self.client.post(reverse('occurrence-bulk-delete'), [{'event': first.pk}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN the calendar hot-path queries and check they hit their indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Give the planner realistic statistics: several users, each with
+        # one-off events scheduled years ahead and series that have ended
+        cls.start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+        cls.end = cls.start + timedelta(days=30)
+        users = [User.objects.create_user(username=f'user{i}', password='secret') for i in range(10)]
+        cls.user = users[0]
+        events = []
+        for user in users:
+            for i in range(300):
+                start = cls.start - timedelta(days=60) + timedelta(days=12 * i)
+                events.append(Event(user=user, title='One-off', start=start, end=start + timedelta(hours=1)))
+            for i in range(30):
+                start = cls.start - timedelta(days=30 * (i + 1))
+                events.append(Event(
+                    user=user, title='Series', start=start, end=start + timedelta(hours=1),
+                    is_recurring=True, frequency='DAILY', until=start + timedelta(days=20),
+                ))
+        Event.objects.bulk_create(events)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE eventapp_event' if connection.vendor == 'postgresql' else 'ANALYZE')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # A few thousand rows are still cheap to scan sequentially; rule
+            # that out so the choice between indexes is what gets tested
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, msg=plan)
+
+    def test_events_by_user_and_start(self):
+        self.assertUsesIndex(Event.objects.filter(user=self.user, start__lte=self.end), 'event_user_start_idx')
+
+    def test_overlapping_events(self):
+        # Most events start after the window, so bounding start beats
+        # collecting every one-off event through the is_recurring index
+        self.assertUsesIndex(Event.objects.overlapping(self.user, self.start, self.end), 'event_user_start_idx')
+
+    def test_active_recurring_series(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest('SQLite cannot match the bare boolean is_recurring predicate to an index column')
+        queryset = Event.objects.filter(user=self.user, is_recurring=True, until__gte=self.start)
+        self.assertUsesIndex(queryset, 'event_user_recurring_until_idx')
+
+    def test_upcoming_events(self):
+        queryset = Event.objects.filter(user=self.user, next_occurrence_at__gte=self.start).order_by('next_occurrence_at')[:20]
+        self.assertUsesIndex(queryset, 'event_user_next_occurrence_idx')
+
+    def test_override_lookup(self):
+        event = Event.objects.create(user=self.user, title='x', start=self.start, end=self.end)
+        queryset = OccurrenceOverride.objects.filter(event=event, original_start=self.start)
+        index_name = 'unique_override_per_occurrence'
+        if connection.vendor == 'sqlite':
+            # SQLite backs table-level unique constraints with an automatic index
+            index_name = 'sqlite_autoindex_eventapp_occurrenceoverride'
+        self.assertUsesIndex(queryset, index_name)
+
+    def test_delete_occurrence_does_not_duplicate(self):
+        event = Event.objects.create(user=self.user, title='x', start=self.start, end=self.end)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('delete-occurrence', args=[event.pk])
+        for _ in range(2):
+            response = client.post(url, {'original_start': self.start.isoformat()})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(event.overrides.count(), 1)
+
+
+class GenerateOccurrencesTests(TestCase):
+    def make_event(self, **kwargs):
+        start = datetime(2015, 1, 5, 9, tzinfo=timezone.utc)  # a Monday
+        return Event(start=start, end=start + timedelta(hours=1), is_recurring=True, **kwargs)
+
+    def test_old_series_jumps_to_window(self):
+        event = self.make_event(frequency='DAILY', interval=3)
+        start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+        occurrences = generate_occurrences(event, start, start + timedelta(days=9))
+        self.assertEqual(len(occurrences), 3)
+        self.assertLess(occurrences[0] - start, timedelta(days=3))
+        self.assertTrue(all((occ - event.start).days % 3 == 0 for occ in occurrences))
+
+    def test_weekly_weekdays_respect_interval(self):
+        event = self.make_event(frequency='WEEKLY', interval=2, weekdays='MO,TH')
+        start = datetime(2025, 6, 2, tzinfo=timezone.utc)  # 543 weeks after event.start: an off week
+        occurrences = generate_occurrences(event, start, start + timedelta(days=14))
+        self.assertEqual([occ.strftime('%a %d') for occ in occurrences], ['Mon 09', 'Thu 12'])
+
+    def test_monthly_day_clamps_to_month_end(self):
+        event = self.make_event(frequency='MONTHLY', interval=1, month_day=31)
+        start = datetime(2025, 2, 1, tzinfo=timezone.utc)
+        occurrences = generate_occurrences(event, start, start + timedelta(days=59))
+        self.assertEqual([occ.day for occ in occurrences], [28, 31])
+
+    def test_monthly_fifth_weekday_skips_months_without_one(self):
+        event = self.make_event(frequency='MONTHLY', interval=1, month_week=5, month_weekday=4)
+        start = datetime(2015, 2, 1, tzinfo=timezone.utc)
+        occurrences = generate_occurrences(event, start, datetime(2015, 7, 1, tzinfo=timezone.utc))
+        self.assertEqual([occ.strftime('%b %d') for occ in occurrences], ['May 29'])
+
+    def test_unmatchable_fifth_weekday_ends_the_series(self):
+        # Every other February from 2015 is in a common year: never a 5th Monday
+        start = datetime(2015, 2, 2, 9, tzinfo=timezone.utc)
+        event = Event(start=start, end=start + timedelta(hours=1), is_recurring=True,
+                      frequency='MONTHLY', interval=24, month_week=5, month_weekday=0)
+        self.assertEqual(list(iter_occurrences(event, start + timedelta(days=1))), [])
+
+    def test_until_bounds_results_to_window(self):
+        event = self.make_event(frequency='DAILY', interval=1, until=datetime(2030, 1, 1, tzinfo=timezone.utc))
+        start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+        occurrences = generate_occurrences(event, start, start + timedelta(days=2))
+        self.assertEqual(len(occurrences), 2)
+
+    def test_iter_occurrences_open_ended_with_limit(self):
+        event = self.make_event(frequency='WEEKLY', interval=1, weekdays='MO,FR')
+        start = datetime(2025, 6, 3, tzinfo=timezone.utc)
+        occurrences = list(iter_occurrences(event, start, limit=3))
+        self.assertEqual([occ.strftime('%a %d') for occ in occurrences], ['Fri 06', 'Mon 09', 'Fri 13'])
+
+    def test_compiled_rule_is_reused_until_event_changes(self):
+        event = self.make_event(frequency='WEEKLY', interval=1, weekdays='MO,WE', pk=42)
+        event.updated_at = event.start
+        rule = compile_rule(event)
+        self.assertIs(compile_rule(event), rule)
+        self.assertEqual(rule.weekday_mask, 0b101)
+
+        event.weekdays = 'FR'
+        event.updated_at += timedelta(seconds=1)
+        self.assertIsNot(compile_rule(event), rule)
+        self.assertEqual(compile_rule(event).weekday_mask, 0b10000)
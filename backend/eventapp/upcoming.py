@@ -0,0 +1,76 @@
+"""Maintenance of Event.next_occurrence_at.
+
+The column holds the start of each event's next occurrence that is not
+cancelled, so "what's next" lists are an indexed ORDER BY ... LIMIT on
+(user, next_occurrence_at) instead of an expansion of every series. It is
+recomputed whenever an event or one of its overrides changes (see
+eventapp.signals) and rolled forward once the stored occurrence has passed,
+by the `roll_next_occurrences` command and lazily before upcoming queries.
+"""
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import Event, EventQuerySet, OccurrenceOverride
+from .recurrence import next_occurrence
+
+BATCH_SIZE = 1000
+
+FIELDS = EventQuerySet.EXPANSION_FIELDS + ('next_occurrence_at',)
+
+
+def update_next_occurrences(events, now=None):
+    """Recompute next_occurrence_at for loaded events and save the changed ones"""
+    now = now or timezone.now()
+    overrides = defaultdict(dict)
+    for override in OccurrenceOverride.objects.filter(event__in=[e.pk for e in events], original_start__gte=now):
+        overrides[override.event_id][override.original_start] = override
+
+    changed = []
+    for event in events:
+        value = next_occurrence(event, now, overrides[event.pk])
+        if value != event.next_occurrence_at:
+            event.next_occurrence_at = value
+            changed.append(event)
+    Event.objects.bulk_update(changed, ['next_occurrence_at'], batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+def _update_in_batches(events, now, batch_size):
+    changed, batch = 0, []
+    for event in events.only(*FIELDS).order_by('pk').iterator(chunk_size=batch_size):
+        batch.append(event)
+        if len(batch) == batch_size:
+            changed += update_next_occurrences(batch, now)
+            batch = []
+    if batch:
+        changed += update_next_occurrences(batch, now)
+    return changed
+
+
+def refresh_next_occurrences(events, now=None, batch_size=BATCH_SIZE):
+    """Recompute next_occurrence_at for events given as instances or ids.
+
+    Instances are updated in place, so callers can serialize them afterwards.
+    """
+    events = list(events)
+    loaded = [event for event in events if isinstance(event, Event)]
+    event_ids = [event for event in events if not isinstance(event, Event)]
+    changed = 0
+    for i in range(0, len(loaded), batch_size):
+        changed += update_next_occurrences(loaded[i:i + batch_size], now)
+    for i in range(0, len(event_ids), batch_size):
+        changed += _update_in_batches(Event.objects.filter(pk__in=event_ids[i:i + batch_size]), now, batch_size)
+    return changed
+
+
+def roll_next_occurrences(now=None, user=None, everything=False, batch_size=BATCH_SIZE):
+    """Move next_occurrence_at past `now` for events whose stored occurrence has started.
+
+    `everything` recomputes all events instead, e.g. to backfill the column.
+    """
+    now = now or timezone.now()
+    events = Event.objects.all() if everything else Event.objects.filter(next_occurrence_at__lt=now)
+    if user is not None:
+        events = events.filter(user=user)
+    return _update_in_batches(events, now, batch_size)
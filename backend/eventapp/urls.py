@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 from rest_framework_simplejwt.views import TokenRefreshView
 urlpatterns = [
     # Authentication endpoints
@@ -13,6 +13,9 @@ urlpatterns = [
         'get': 'list',
         'post': 'create'
     }), name='event-list'),
+    path('events/bulk/', views.EventViewSet.as_view({
+        'post': 'bulk'
+    }), name='event-bulk'),
     path('events/<int:pk>/', views.EventViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
@@ -22,15 +25,28 @@ urlpatterns = [
     path('events/<int:pk>/delete_occurrence/', views.EventViewSet.as_view({
         'post': 'delete_occurrence'
     }), name='delete-occurrence'),
+    path('events/<int:pk>/split/', views.EventViewSet.as_view({
+        'post': 'split'
+    }), name='event-split'),
+    path('events/<int:pk>/overrides/', views.EventViewSet.as_view({
+        'post': 'overrides'
+    }), name='event-overrides'),
     
     # Calendar endpoints
     path('calendar/', views.CalendarView.as_view(), name='calendar'),
+    path('calendar/async/', async_views.AsyncCalendarView.as_view(), name='calendar-async'),
+    path('calendar/availability/', views.AvailabilityView.as_view(), name='calendar-availability'),
+    path('calendar/freebusy/', views.FreeBusyView.as_view(), name='calendar-freebusy'),
+    path('calendar/cache-stats/', views.CalendarCacheStatsView.as_view(), name='calendar-cache-stats'),
     
     # Occurrence endpoints
     path('occurrences/', views.OccurrenceViewSet.as_view({
         'get': 'list',
         'post': 'create'
     }), name='occurrence-list'),
+    path('occurrences/bulk_delete/', views.OccurrenceViewSet.as_view({
+        'post': 'bulk_delete'
+    }), name='occurrence-bulk-delete'),
     path('occurrences/<int:pk>/', views.OccurrenceViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
@@ -39,4 +55,10 @@ urlpatterns = [
     }), name='occurrence-detail'),
     path('events/<int:event_id>/export/', views.ExportEventView.as_view(), name='export-event'),
 path('calendar/export/', views.ExportCalendarView.as_view(), name='export-calendar'),
+    path('events/<int:event_id>/export/async/', async_views.AsyncExportEventView.as_view(), name='export-event-async'),
+    path('calendar/export/async/', async_views.AsyncExportCalendarView.as_view(), name='export-calendar-async'),
+    path('calendar/export/jobs/', views.ExportJobListView.as_view(), name='export-job-list'),
+    path('calendar/export/jobs/<int:pk>/', views.ExportJobDetailView.as_view(), name='export-job-detail'),
+    path('calendar/export/jobs/<int:pk>/download/', views.ExportJobDownloadView.as_view(), name='export-job-download'),
+    path('calendar/import/', views.ImportCalendarView.as_view(), name='import-calendar'),
 ]
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""Per-user calendar versions and HTTP conditional GET for calendar endpoints.
+
+Every write to a user's events or overrides bumps User.calendar_version (see
+eventapp.signals). Calendar responses are a function of that version, the
+request URL and the negotiated media type, so together they make a strong
+ETag that can be checked before any recurrence work is done. No
+Last-Modified is sent: HTTP dates have whole-second precision, and two
+writes within one second would leave If-Modified-Since clients with a stale
+304. Writes that bypass model signals (bulk_create, queryset.update()) must
+call bump_calendar_version themselves.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .models import User
+
+
+def bump_calendar_version(user_id):
+    """Invalidate a user's cached calendar responses; user_id may be a subquery"""
+    User.objects.filter(pk=user_id).update(calendar_version=F('calendar_version') + 1)
+
+
+def calendar_etag(request):
+    """Strong ETag for the calendar data the request asks for, in the format it gets"""
+    user = request.user
+    # Set by DRF's content negotiation; the async views render a single format
+    media_type = getattr(request, 'accepted_media_type', '')
+    key = f'{user.pk}:{user.calendar_version}:{media_type}:{request.get_full_path()}'
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+
+def _finish_response(response, etag):
+    if response.status_code == 200:
+        response['ETag'] = etag
+    patch_vary_headers(response, ['Accept'])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_calendar(view_method):
+    """Answer If-None-Match with 304 before running the view.
+
+    Successful responses get an ETag header and must be revalidated by
+    clients before reuse. Works on sync and async methods.
+    """
+    if iscoroutinefunction(view_method):
+        @wraps(view_method)
+        async def async_wrapper(self, request, *args, **kwargs):
+            etag = calendar_etag(request)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view_method(self, request, *args, **kwargs)
+            return _finish_response(response, etag)
+        return async_wrapper
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        etag = calendar_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view_method(self, request, *args, **kwargs)
+        return _finish_response(response, etag)
+    return wrapper
@@ -2,20 +2,59 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.views import APIView
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.parsers import MultiPartParser
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
-from .models import Event, OccurrenceOverride
-from .serializers import EventSerializer, OccurrenceOverrideSerializer, UserSerializer
-from .recurrence import generate_occurrences
+from .models import Event, ExportJob, OccurrenceOverride
+from .serializers import EventSerializer, ExportJobSerializer, OccurrenceOverrideSerializer, UserSerializer
+from .recurrence import get_override_index, iter_occurrences, merge_occurrences, resolve_occurrence
+from .materialization import get_horizon
+from .versioning import bump_calendar_version, conditional_calendar
+from .signals import calendar_signals_deferred, refresh_events
+from .ics_import import import_ics
+from .upcoming import roll_next_occurrences
+from .freebusy import WORKDAYS, WEEKDAY_CODES, find_common_slots, get_free_busy, participant_busy, working_intervals
+from .overrides import cancel_occurrences, is_occurrence, shift_occurrences
+from .payload import SHAPES, CalendarJSONRenderer, CalendarPayload, WindowsPayload
+from .expansion import expand_windows, materialized_windows
+from .export_jobs import job_path, request_export, stream_export
+from . import calendar_cache, ical
 from datetime import datetime
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.http import Http404
 from django.shortcuts import get_object_or_404
-from icalendar import Calendar, Event as ICalEvent
-from django.http import HttpResponse
-from datetime import datetime, timedelta
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from datetime import datetime, time, timedelta
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_duration
+from rest_framework.utils.urls import replace_query_param
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import base64
+import binascii
+import os
 User = get_user_model()
+
+MAX_BULK_ITEMS = 5000
+BULK_BATCH_SIZE = 500
+BULK_UPDATE_FIELDS = [
+    'title', 'description', 'start', 'end', 'is_recurring', 'frequency', 'interval',
+    'weekdays', 'month_day', 'month_week', 'month_weekday', 'until', 'updated_at',
+]
+MAX_CALENDAR_WINDOWS = 24
+CALENDAR_PAGE_SIZE = 100
+UPCOMING_PAGE_SIZE = 10
+MAX_CALENDAR_PAGE_SIZE = 1000
+AVAILABILITY_SLOTS = 5
+MAX_AVAILABILITY_SLOTS = 100
+MAX_AVAILABILITY_PARTICIPANTS = 100
+MAX_AVAILABILITY_DAYS = 92
+EXPORT_JOB_PAGE_SIZE = 20
+
 class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return obj.user == request.user
@@ -26,9 +65,39 @@ class EventViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Event.objects.filter(user=self.request.user)
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['check_conflicts'] = self.request.query_params.get('check_conflicts') in ('true', '1')
+        return context
+    
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('upcoming') in ('true', '1'):
+            return self.upcoming(request)
+        return super().list(request, *args, **kwargs)
+    
+    def upcoming(self, request):
+        """The user's events ordered by their next occurrence (?upcoming=true&limit=N).
+
+        Served from the (user, next_occurrence_at) index; events whose stored
+        next occurrence has already started are rolled forward first.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', UPCOMING_PAGE_SIZE)), MAX_CALENDAR_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        now = timezone.now()
+        roll_next_occurrences(now, user=request.user)
+        events = (
+            self.get_queryset()
+            .filter(next_occurrence_at__gte=now)
+            .order_by('next_occurrence_at', 'pk')[:max(limit, 0)]
+        )
+        return Response(self.get_serializer(events, many=True).data)
+    
     def get_object(self):
         """Override to provide a custom error message when an event is not found."""
         queryset = self.get_queryset()
@@ -49,60 +118,484 @@ class EventViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Missing original_start'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            original_start_dt = datetime.fromisoformat(original_start)
+            original_start_dt = parse_aware(original_start)
         except (TypeError, ValueError):
             return Response({'error': 'Invalid date format'}, status=status.HTTP_400_BAD_REQUEST)
         
-        OccurrenceOverride.objects.create(
-            event=event,
-            original_start=original_start_dt,
-            is_cancelled=True
-        )
+        cancel_occurrences(event, [original_start_dt])
         return Response({'status': 'occurrence deleted'}, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['post'])
+    def split(self, request, pk=None):
+        """Change the occurrence at original_start and all following ones.
+
+        The series is cut just before that occurrence and a successor event
+        carrying the changes takes over from it, along with the overrides of
+        later occurrences that still match its pattern. Body:
+        {"original_start": iso, ...event fields to change}.
+        """
+        event = self.get_object()
+        if not event.is_recurring:
+            return Response({'error': 'Only recurring events can be split'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            at = parse_aware(request.data['original_start'])
+        except (TypeError, KeyError, ValueError):
+            return Response({'error': 'Missing or invalid original_start'}, status=status.HTTP_400_BAD_REQUEST)
+        if not is_occurrence(event, at):
+            return Response({'error': 'original_start is not an occurrence of this event'}, status=status.HTTP_400_BAD_REQUEST)
+        if at == event.start:
+            return Response({'error': 'Cannot split at the first occurrence; update the event instead'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # The successor starts as a copy of the series from `at` on
+        data = {
+            **self.get_serializer(event).data,
+            'start': at.isoformat(),
+            'end': (at + (event.end - event.start)).isoformat(),
+        }
+        data.update((field, value) for field, value in request.data.items() if field != 'original_start')
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        
+        with transaction.atomic(), calendar_signals_deferred():
+            successor = serializer.save(user=request.user)
+            event.until = at - timedelta(microseconds=1)
+            event.save(update_fields=['until', 'updated_at'])
+            
+            later = event.overrides.filter(original_start__gte=at)
+            matching = [o.pk for o in later if is_occurrence(successor, o.original_start)]
+            moved = event.overrides.filter(pk__in=matching).update(event=successor)
+            # Whatever is left no longer names an occurrence of either event
+            dropped, _ = later.delete()
+            
+            bump_calendar_version(request.user.pk)
+            refresh_events([event, successor])
+        
+        return Response({
+            'event': self.get_serializer(event).data,
+            'successor': serializer.data,
+            'movedOverrides': moved,
+            'droppedOverrides': dropped,
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=True, methods=['post'])
+    def overrides(self, request, pk=None):
+        """Cancel or shift many occurrences of the event at once.
+
+        Body: {"action": "cancel" | "shift", "shift": duration (for shift),
+        and either "original_starts": [iso, ...] or "start"/"end" to pick
+        every occurrence in a range}. Durations are ISO 8601 ("PT1H") or
+        "[DD] [HH:[MM:]]ss". All rows are upserted in one statement.
+        """
+        event = self.get_object()
+        action_name = request.data.get('action')
+        if action_name not in ('cancel', 'shift'):
+            return Response({'error': 'action must be cancel or shift'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        delta = None
+        if action_name == 'shift':
+            delta = parse_duration(str(request.data.get('shift', '')))
+            if not delta:
+                return Response({'error': 'shift must be a non-zero duration'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            if 'original_starts' in request.data:
+                original_starts = [parse_aware(value) for value in request.data['original_starts']]
+            else:
+                start = parse_aware(request.data['start'])
+                end = parse_aware(request.data['end'])
+                original_starts = list(iter_occurrences(event, start, end, limit=MAX_BULK_ITEMS + 1))
+        except (TypeError, KeyError, ValueError):
+            return Response({'error': 'Expected original_starts or start and end in ISO format'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(original_starts) > MAX_BULK_ITEMS:
+            return Response({'error': f'At most {MAX_BULK_ITEMS} occurrences per request'}, status=status.HTTP_400_BAD_REQUEST)
+        invalid = [occ.isoformat() for occ in original_starts if not is_occurrence(event, occ)] if 'original_starts' in request.data else []
+        if invalid:
+            return Response({'error': 'Not occurrences of this event', 'original_starts': invalid}, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            if delta is None:
+                count = cancel_occurrences(event, original_starts)
+            else:
+                count = shift_occurrences(event, original_starts, delta)
+        return Response({'updated': count})
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create, update and delete many events in one transaction.
+
+        Body: {"create": [event, ...], "update": [event with id, ...], "delete": [id, ...]}.
+        Nothing is written unless every item is valid; otherwise the 400
+        response lists one error object per item of each failing section,
+        empty for the valid ones.
+        """
+        sections = [request.data.get(name, []) for name in ('create', 'update', 'delete')]
+        if not all(isinstance(section, list) for section in sections):
+            return Response({'error': 'create, update and delete must be lists'}, status=status.HTTP_400_BAD_REQUEST)
+        if sum(len(section) for section in sections) > MAX_BULK_ITEMS:
+            return Response({'error': f'At most {MAX_BULK_ITEMS} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+        create, update, delete = sections
+        
+        errors = {}
+        creator = self.get_serializer(data=create, many=True)
+        if not creator.is_valid():
+            errors['create'] = creator.errors
+        
+        existing = self.get_queryset().in_bulk([
+            item['id'] for item in update if isinstance(item, dict) and isinstance(item.get('id'), int)
+        ])
+        updaters, update_errors, seen = [], [], set()
+        for item in update:
+            instance = existing.get(item.get('id')) if isinstance(item, dict) else None
+            if instance is None or instance.pk in seen:
+                update_errors.append({'id': ['Unknown or repeated event id']})
+                continue
+            seen.add(instance.pk)
+            serializer = self.get_serializer(instance, data=item)
+            update_errors.append({} if serializer.is_valid() else serializer.errors)
+            updaters.append(serializer)
+        if any(update_errors):
+            errors['update'] = update_errors
+        
+        ids = [pk for pk in delete if isinstance(pk, int)]
+        owned = set(self.get_queryset().filter(pk__in=ids).values_list('pk', flat=True))
+        delete_errors = [{} if pk in owned else {'id': ['Unknown event id']} for pk in delete]
+        if any(delete_errors):
+            errors['delete'] = delete_errors
+        
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Bulk writes skip model signals, so the calendar version and the
+        # materialized occurrences are refreshed once for the whole batch
+        with transaction.atomic(), calendar_signals_deferred():
+            created = Event.objects.bulk_create(
+                [Event(user=request.user, **attrs) for attrs in creator.validated_data],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            now = timezone.now()
+            updated = []
+            for serializer in updaters:
+                for attr, value in serializer.validated_data.items():
+                    setattr(serializer.instance, attr, value)
+                serializer.instance.updated_at = now
+                updated.append(serializer.instance)
+            Event.objects.bulk_update(updated, BULK_UPDATE_FIELDS, batch_size=BULK_BATCH_SIZE)
+            _, deleted = self.get_queryset().filter(pk__in=owned).delete()
+            
+            if created or updated or owned:
+                bump_calendar_version(request.user.pk)
+                refresh_events(created + updated)
+        
+        return Response({
+            'created': self.get_serializer(created, many=True).data,
+            'updated': self.get_serializer(updated, many=True).data,
+            'deleted': deleted.get(Event._meta.label, 0),
+        })
 class OccurrenceViewSet(viewsets.ModelViewSet):
     serializer_class = OccurrenceOverrideSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         return OccurrenceOverride.objects.filter(event__user=self.request.user)
+    
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        """Delete overrides by occurrence: [{"event": id, "original_start": iso}, ...].
+
+        Pairs that match no override of the user's events are ignored.
+        """
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of overrides'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > MAX_BULK_ITEMS:
+            return Response({'error': f'At most {MAX_BULK_ITEMS} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        starts_by_event = defaultdict(list)
+        errors = []
+        for item in request.data:
+            try:
+                event_id, original_start = item['event'], parse_aware(item['original_start'])
+            except (TypeError, KeyError, ValueError):
+                errors.append({'error': 'Expected event and an ISO original_start'})
+                continue
+            if not isinstance(event_id, int):
+                errors.append({'event': ['Expected an event id']})
+                continue
+            starts_by_event[event_id].append(original_start)
+            errors.append({})
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        matching = Q()
+        for event_id, starts in starts_by_event.items():
+            matching |= Q(event_id=event_id, original_start__in=starts)
+        overrides = self.get_queryset().filter(matching) if starts_by_event else self.get_queryset().none()
+        
+        with transaction.atomic(), calendar_signals_deferred():
+            event_ids = set(overrides.values_list('event_id', flat=True))
+            deleted, _ = overrides.delete()
+            if deleted:
+                bump_calendar_version(request.user.pk)
+                refresh_events(event_ids)
+        return Response({'deleted': deleted})
+
+def parse_aware(value):
+    """datetime.fromisoformat(), with naive values taken in the current time zone"""
+    value = datetime.fromisoformat(value)
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+def encode_cursor(original_start, event_id):
+    raw = f'{original_start.isoformat()}|{event_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+    original_start, _, event_id = raw.partition('|')
+    original_start = datetime.fromisoformat(original_start)
+    if timezone.is_naive(original_start):
+        raise ValueError('Invalid cursor')
+    return original_start, int(event_id)
+
+def parse_windows(params):
+    """Read the windows a calendar request asks for.
+
+    Accepts repeated `window=<start>/<end>` pairs or `months=YYYY-MM,YYYY-MM`.
+    Month windows run from the first instant of the month to the last; naive
+    times and months are taken in the current time zone.
+    Raises ValueError on malformed input.
+    """
+    windows = []
+    for window in params.getlist('window'):
+        start_str, _, end_str = window.partition('/')
+        windows.append((parse_aware(start_str), parse_aware(end_str)))
+    
+    months = params.get('months')
+    if months:
+        tz = timezone.get_current_timezone()
+        for month in months.split(','):
+            first = datetime.strptime(month.strip(), '%Y-%m').replace(tzinfo=tz)
+            next_first = (first + timedelta(days=32)).replace(day=1)
+            windows.append((first, next_first - timedelta(microseconds=1)))
+    
+    if len(windows) > MAX_CALENDAR_WINDOWS:
+        raise ValueError(f'At most {MAX_CALENDAR_WINDOWS} windows per request')
+    if any(start > end for start, end in windows):
+        raise ValueError('Window start must not be after its end')
+    return windows
+
+def parse_availability(params):
+    """Read an availability search; raises ValueError on malformed input"""
+    try:
+        start, end = parse_aware(params['start']), parse_aware(params['end'])
+        duration = parse_duration(params['duration'])
+    except KeyError as e:
+        raise ValueError(f'Missing {e.args[0]} parameter')
+    step = parse_duration(params['step']) if 'step' in params else None
+    if duration is None or duration <= timedelta(0) or (step is not None and step <= timedelta(0)):
+        raise ValueError('duration and step must be positive durations')
+    if not start < end <= start + timedelta(days=MAX_AVAILABILITY_DAYS):
+        raise ValueError(f'end must be after start and at most {MAX_AVAILABILITY_DAYS} days later')
+    
+    participants = [pk.strip() for pk in params.get('participants', '').split(',') if pk.strip()]
+    if len(participants) > MAX_AVAILABILITY_PARTICIPANTS:
+        raise ValueError(f'At most {MAX_AVAILABILITY_PARTICIPANTS} participants')
+    limit = min(int(params.get('limit', AVAILABILITY_SLOTS)), MAX_AVAILABILITY_SLOTS)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    
+    try:
+        tz = ZoneInfo(params['tz']) if 'tz' in params else timezone.get_current_timezone()
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone {params['tz']}")
+    day_start = time.fromisoformat(params.get('work_start', '09:00'))
+    day_end = time.fromisoformat(params.get('work_end', '17:00'))
+    weekdays = params['weekdays'].split(',') if 'weekdays' in params else WORKDAYS
+    if any(day not in WEEKDAY_CODES for day in weekdays):
+        raise ValueError('weekdays must be a comma-separated list of MO..SU')
+    working = working_intervals(start, end, day_start, day_end, tz, weekdays)
+    return participants, working, duration, step, limit
+
+class AvailabilityView(APIView):
+    """Earliest slots in which the current user and all participants are free.
+
+    GET /calendar/availability/?participants=<comma-separated user ids>&start=&end=&duration=
+    with optional limit, step, work_start, work_end (HH:MM), tz and weekdays.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        try:
+            participants, working, duration, step, limit = parse_availability(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        user_ids = set(participants) | {request.user.pk}
+        if User.objects.filter(pk__in=user_ids).count() != len(user_ids):
+            return Response({'error': 'Unknown participant'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if working:
+            busy = participant_busy(user_ids, working[0][0], working[-1][1])
+            slots = find_common_slots(busy.values(), working, duration, limit, step)
+        else:
+            slots = []
+        return Response({
+            'participants': sorted(user_ids),
+            'slots': [{'start': s.isoformat(), 'end': e.isoformat()} for s, e in slots],
+        })
+
 class CalendarView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [CalendarJSONRenderer, BrowsableAPIRenderer]
     
+    @conditional_calendar
     def get(self, request):
+        shape = request.query_params.get('shape', 'flat')
+        if shape not in SHAPES:
+            return Response({'error': f"shape must be one of {', '.join(SHAPES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if 'window' in request.query_params or 'months' in request.query_params:
+            return self.get_windows(request, shape)
+        
         start_str = request.query_params.get('start')
         end_str = request.query_params.get('end')
         
         try:
-            start = datetime.fromisoformat(start_str) if start_str else None
-            end = datetime.fromisoformat(end_str) if end_str else None
+            start = parse_aware(start_str) if start_str else None
+            end = parse_aware(end_str) if end_str else None
         except (TypeError, ValueError):
             return Response({'error': 'Invalid date format'}, status=status.HTTP_400_BAD_REQUEST)
         
         if not start or not end:
             return Response({'error': 'Missing start or end parameters'}, status=status.HTTP_400_BAD_REQUEST)
         
-        events = Event.objects.filter(user=request.user)
+        if 'limit' in request.query_params or 'cursor' in request.query_params:
+            return self.get_page(request, start, end)
+        
+        return Response(CalendarPayload(self.window_results(request.user, [(start, end)])[0], shape))
+    
+    def get_page(self, request, start, end):
+        """One page of the window, ordered by (originalStart, id).
+
+        Per-event expansions are merged lazily, so only one page worth of
+        occurrences is produced. `next` carries an opaque cursor holding the
+        last (originalStart, id) returned.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', CALENDAR_PAGE_SIZE)), MAX_CALENDAR_PAGE_SIZE)
+            after = decode_cursor(request.query_params['cursor']) if 'cursor' in request.query_params else None
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        resume_from = max(start, after[0]) if after else start
+        events = Event.objects.overlapping(request.user, resume_from, end)
+        overrides = get_override_index(request.user, resume_from, end)
+        
         results = []
+        last = None
+        for occ, event in merge_occurrences(events, resume_from, end):
+            if after and (occ, event.id) <= after:
+                continue
+            resolved = resolve_occurrence(event, occ, overrides.get((event.id, occ)))
+            if resolved is None:
+                continue  # Skip cancelled occurrences
+            if len(results) == limit:
+                break
+            
+            occ_start, occ_end = resolved
+            results.append({
+                'id': event.id,
+                'title': event.title,
+                'description': event.description,
+                'start': occ_start.isoformat(),
+                'end': occ_end.isoformat(),
+                'isRecurring': event.is_recurring,
+                'originalStart': occ.isoformat(),
+            })
+            last = (occ, event.id)
+        else:
+            last = None  # stream exhausted: this is the final page
+        
+        next_url = None
+        if last:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(*last))
+        return Response({'next': next_url, 'results': results})
+    
+    def get_windows(self, request, shape):
+        """Several windows in one call, returned as one bucket per window"""
+        try:
+            windows = parse_windows(request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        buckets = self.window_results(request.user, windows)
+        return Response(WindowsPayload(windows, [CalendarPayload(groups, shape) for groups in buckets]))
+    
+    def window_results(self, user, windows):
+        """Occurrence groups for each window, from the cache where possible"""
+        results = [calendar_cache.get_window(user, start, end) for start, end in windows]
+        missing = [i for i, cached in enumerate(results) if cached is None]
+        if not missing:
+            return results
+        
+        horizon = get_horizon()
+        missing_windows = [windows[i] for i in missing]
+        if horizon and all(horizon.covers(*window) for window in missing_windows):
+            built = self.materialized_results(user, missing_windows)
+        else:
+            built = self.expanded_results(user, missing_windows)
+        
+        for i, events in zip(missing, built):
+            calendar_cache.set_window(user, *windows[i], events)
+            results[i] = events
+        return results
+    
+    def expanded_results(self, user, windows):
+        """Load events and overrides once for the span of all windows and expand them"""
+        span_start = min(start for start, _ in windows)
+        span_end = max(end for _, end in windows)
+        events = Event.objects.overlapping(user, span_start, span_end)
+        overrides = get_override_index(user, span_start, span_end)
+        return expand_windows(events, overrides, windows)
+    
+    def materialized_results(self, user, windows):
+        return materialized_windows(user, windows)
+
+class FreeBusyView(APIView):
+    """Merged busy blocks and free gaps in [start, end) for the current user"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    @conditional_calendar
+    def get(self, request):
+        try:
+            start = parse_aware(request.query_params['start'])
+            end = parse_aware(request.query_params['end'])
+        except KeyError:
+            return Response({'error': 'Missing start or end parameters'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'error': 'Invalid date format'}, status=status.HTTP_400_BAD_REQUEST)
+        if start >= end:
+            return Response({'error': 'end must be after start'}, status=status.HTTP_400_BAD_REQUEST)
         
-        for event in events:
-            occurrences = generate_occurrences(event, start, end)
-            for occ in occurrences:
-                override = event.overrides.filter(original_start=occ).first()
-                
-                if override and override.is_cancelled:
-                    continue  # Skip cancelled occurrences
-                
-                results.append({
-                    'id': event.id,
-                    'title': event.title,
-                    'description': event.description,
-                    'start': override.new_start.isoformat() if override and override.new_start else occ.isoformat(),
-                    'end': override.new_end.isoformat() if override and override.new_end else event.end.isoformat(),
-                    'isRecurring': event.is_recurring,
-                    'originalStart': occ.isoformat(),
-                })
-        
-        return Response(results)
+        busy, free = get_free_busy(request.user, start, end)
+        return Response({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'busy': [{'start': s.isoformat(), 'end': e.isoformat()} for s, e in busy],
+            'free': [{'start': s.isoformat(), 'end': e.isoformat()} for s, e in free],
+        })
+
+class CalendarCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        return Response(calendar_cache.get_stats())
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -149,96 +642,157 @@ class LogoutView(APIView):
 class ExportEventView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
+    @conditional_calendar
     def get(self, request, event_id):
-        event = get_object_or_404(Event, id=event_id)
-        
-        # Create iCalendar
-        cal = Calendar()
-        cal.add('prodid', '-//Event Scheduler//mxm.dk//')
-        cal.add('version', '2.0')
-        
-        ical_event = ICalEvent()
-        ical_event.add('summary', event.title)
-        ical_event.add('description', event.description)
-        ical_event.add('dtstart', event.start)
-        ical_event.add('dtend', event.end)
-        ical_event.add('dtstamp', datetime.now())
-        ical_event.add('uid', f'event-{event.id}@eventscheduler.com')
-        
-        if event.is_recurring:
-            rrule = {}
-            if event.frequency == 'DAILY':
-                rrule['FREQ'] = 'DAILY'
-            elif event.frequency == 'WEEKLY':
-                rrule['FREQ'] = 'WEEKLY'
-                if event.weekdays:
-                    rrule['BYDAY'] = event.weekdays.split(',')
-            elif event.frequency == 'MONTHLY':
-                rrule['FREQ'] = 'MONTHLY'
-            elif event.frequency == 'YEARLY':
-                rrule['FREQ'] = 'YEARLY'
-            
-            rrule['INTERVAL'] = event.interval
-            
-            if event.until:
-                rrule['UNTIL'] = event.until
-                
-            ical_event.add('rrule', rrule)
-        
-        cal.add_component(ical_event)
+        event = get_object_or_404(Event, id=event_id, user=request.user)
         
-        response = HttpResponse(cal.to_ical(), content_type='text/calendar')
+        content = ical.event_calendar(event, event.overrides.all(), datetime.now())
+        response = HttpResponse(content, content_type='text/calendar')
         response['Content-Disposition'] = f'attachment; filename="event_{event.id}.ics"'
         return response
 
 class ExportCalendarView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
+    @conditional_calendar
     def get(self, request):
         start_str = request.query_params.get('start')
         end_str = request.query_params.get('end')
         
         try:
-            start = datetime.fromisoformat(start_str) if start_str else None
-            end = datetime.fromisoformat(end_str) if end_str else None
+            start = parse_aware(start_str) if start_str else None
+            end = parse_aware(end_str) if end_str else None
         except (TypeError, ValueError):
             return Response({'error': 'Invalid date format'}, status=status.HTTP_400_BAD_REQUEST)
         
+        if not start or not end:
+            return Response({'error': 'Missing start or end parameters'}, status=status.HTTP_400_BAD_REQUEST)
+        
         # Get events (same as calendar view)
         # if request.user.is_admin:
         #     events = Event.objects.all()
         # else:
-        events = Event.objects.filter(user=request.user)
-        
-        # Create iCalendar
-        cal = Calendar()
-        cal.add('prodid', '-//Event Scheduler//mxm.dk//')
-        cal.add('version', '2.0')
-        
-        for event in events:
-            # Generate occurrences
-            occurrences = generate_occurrences(event, start, end)
-            for occ in occurrences:
-                # Skip cancelled occurrences
-                override = event.overrides.filter(original_start=occ).first()
-                if override and override.is_cancelled:
-                    continue
-                    
-                # Create event for each occurrence
-                ical_event = ICalEvent()
-                ical_event.add('summary', event.title)
-                ical_event.add('description', event.description)
-                
-                event_start = override.new_start if override else occ
-                event_end = override.new_end if override else event.end
-                
-                ical_event.add('dtstart', event_start)
-                ical_event.add('dtend', event_end)
-                ical_event.add('dtstamp', datetime.now())
-                ical_event.add('uid', f'event-{event.id}-{occ.isoformat()}@eventscheduler.com')
-                
-                cal.add_component(ical_event)
-        
-        response = HttpResponse(cal.to_ical(), content_type='text/calendar')
+        mode = request.query_params.get('mode', 'occurrences')
+        if mode not in ('occurrences', 'series'):
+            return Response({'error': 'Invalid mode, expected occurrences or series'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # ?parallel=true renders chunks of events in worker processes; each
+        # request starts a pool, so it is reserved for staff
+        workers = 1
+        if request.query_params.get('parallel') in ('true', '1'):
+            if not request.user.is_staff:
+                return Response({'error': 'Parallel export is only available to staff'}, status=status.HTTP_403_FORBIDDEN)
+            workers = None
+        content = stream_export(request.user, start, end, mode, workers)
+        response = StreamingHttpResponse(content, content_type='text/calendar')
         response['Content-Disposition'] = 'attachment; filename="calendar.ics"'
-        return response
\ No newline at end of file
+        return response
+
+class ExportJobListView(APIView):
+    """Background exports: POST {start, end, mode} queues one, GET lists recent ones"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        jobs = ExportJob.objects.filter(user=request.user).order_by('-created_at')[:EXPORT_JOB_PAGE_SIZE]
+        return Response(ExportJobSerializer(jobs, many=True, context={'request': request}).data)
+    
+    def post(self, request):
+        serializer = ExportJobSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        job, created = request_export(request.user, **serializer.validated_data)
+        data = ExportJobSerializer(job, context={'request': request}).data
+        # An unchanged calendar reuses the existing job and its file
+        return Response(data, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+class ExportJobDetailView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+        return Response(ExportJobSerializer(job, context={'request': request}).data)
+
+def parse_range(header, size):
+    """The (first, last) byte positions of a single `bytes=` Range header.
+
+    Returns None when the whole file should be sent (no header, or a form
+    we do not serve such as multiple ranges); raises ValueError when the
+    range cannot be satisfied.
+    """
+    unit, _, ranges = (header or '').partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        return None
+    first, _, last = ranges.strip().partition('-')
+    try:
+        if first:
+            first, last = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            first, last = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if first > last or first >= size:
+        raise ValueError('Unsatisfiable range')
+    return first, last
+
+def read_file_range(path, first, length, block_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(first)
+        while length > 0:
+            block = f.read(min(block_size, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+class ExportJobDownloadView(APIView):
+    """The finished export file, with Range requests for resuming downloads"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+        if job.status != ExportJob.DONE:
+            return Response({'error': 'Export is not finished', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+        
+        path, size = job_path(job), job.size
+        if not os.path.exists(path):
+            return Response({'error': 'Export file is no longer available'}, status=status.HTTP_410_GONE)
+        etag = f'"export-{job.pk}-{size}"'
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range != etag:
+            range_header = None  # The client's partial copy is of another file
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        
+        if byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type='text/calendar')
+        else:
+            first, last = byte_range
+            response = StreamingHttpResponse(
+                read_file_range(path, first, last - first + 1),
+                content_type='text/calendar',
+                status=status.HTTP_206_PARTIAL_CONTENT,
+            )
+            response['Content-Range'] = f'bytes {first}-{last}/{size}'
+            response['Content-Length'] = last - first + 1
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Content-Disposition'] = f'attachment; filename="calendar-{job.pk}.ics"'
+        return response
+
+class ImportCalendarView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    
+    def post(self, request):
+        """Import the VEVENTs of an uploaded .ics file (multipart field `file`)"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Missing file'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Django spools large uploads to disk; the importer reads them line by line
+        result = import_ics(request.user, upload)
+        return Response(result, status=status.HTTP_201_CREATED)